@@ -2,7 +2,12 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import JSON, event, inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.pool import StaticPool
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -17,11 +22,35 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
 # Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///youtube_shorts_generator.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+database_url = os.environ.get("DATABASE_URL", "sqlite:///youtube_shorts_generator.db")
+is_sqlite = database_url.startswith("sqlite")
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+
+engine_options = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if is_sqlite:
+    # Background worker threads share the engine, so allow cross-thread use
+    # and wait on locks instead of failing immediately
+    engine_options["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    if database_url in ("sqlite://", "sqlite:///") or ":memory:" in database_url:
+        # An in-memory database only exists on a single connection
+        engine_options["poolclass"] = StaticPool
+else:
+    # Processing and upload threads each hold a connection while they run
+    engine_options.update(
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=30,
+    )
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+
+# Let a front-end server stream downloads instead of the Flask worker:
+# USE_X_SENDFILE for Apache/lighttpd, X_ACCEL_REDIRECT_PREFIX for an nginx
+# "internal" location aliased to the outputs directory (e.g. /protected/outputs/)
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+app.config["X_ACCEL_REDIRECT_PREFIX"] = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
 
 # Configure API keys
 app.config["GEMINI_API_KEY"] = os.environ.get("GEMINI_API_KEY")
@@ -42,7 +71,103 @@ os.makedirs('uploads', exist_ok=True)
 os.makedirs('outputs', exist_ok=True)
 os.makedirs('temp', exist_ok=True)
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL so readers don't block the background writer threads"""
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new database file, so it has to run before
+    # anything else writes the header; cleanup.py reclaims pages with it
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# Denormalized video_jobs counters added after the first release, with the
+# statement that backfills each one from video_shorts
+_JOB_COUNTERS = {
+    'shorts_count': (
+        "UPDATE video_jobs SET shorts_count = (SELECT COUNT(*) FROM video_shorts "
+        "WHERE video_shorts.job_id = video_jobs.id)"),
+    'pending_shorts': (
+        "UPDATE video_jobs SET pending_shorts = (SELECT COUNT(*) FROM video_shorts "
+        "WHERE video_shorts.job_id = video_jobs.id "
+        "AND (video_shorts.upload_status IS NULL "
+        "OR video_shorts.upload_status <> 'COMPLETED'))"),
+}
+
+
+def _job_columns():
+    return {c['name'] for c in inspect(db.engine).get_columns('video_jobs')}
+
+
+def _add_job_counter(name, backfill):
+    """Add and backfill a video_jobs counter column unless it already exists"""
+    if name in _job_columns():
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"ALTER TABLE video_jobs ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0")
+            conn.exec_driver_sql(backfill)
+    except DBAPIError:
+        # Another process running the upgrade added it first
+        if name not in _job_columns():
+            raise
+
+
+def _convert_json_columns():
+    """Turn json columns on PostgreSQL into jsonb; returns how many were converted"""
+    inspector = inspect(db.engine)
+    converted = 0
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for column in inspector.get_columns(table.name):
+                if isinstance(column['type'], JSON) and not isinstance(column['type'], JSONB):
+                    conn.exec_driver_sql(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column["name"]} '
+                        f'TYPE jsonb USING {column["name"]}::jsonb')
+                    converted += 1
+    return converted
+
+
+def upgrade_schema():
+    """Bring an existing database up to the current models.
+
+    create_all only adds missing tables, so columns, types and indexes
+    added to existing tables since are applied here. Every step checks
+    first, so it is safe to run again. Runs once per deploy (flask init-db)
+    rather than at import, where every web and RQ worker would race it.
+    """
+    import models
+    db.create_all()
+
+    for name, backfill in _JOB_COUNTERS.items():
+        _add_job_counter(name, backfill)
+
+    # The GIN index comes with a new table; an old one gets it once its
+    # keywords column has become jsonb
+    if db.engine.dialect.name == 'postgresql' and _convert_json_columns():
+        with db.engine.begin() as conn:
+            conn.execute(models.KEYWORDS_GIN_INDEX)
+
+    # Likewise the model indexes only come with new tables; existing ones
+    # are skipped
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and upgrade an existing database's schema"""
+    upgrade_schema()
+    print("Database schema is up to date")
+
 with app.app_context():
+    if is_sqlite:
+        event.listen(db.engine, "connect", _set_sqlite_pragmas)
+
     # Import models to ensure tables are created
     import models
     db.create_all()
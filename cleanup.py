@@ -1,125 +1,215 @@
 #!/usr/bin/env python3
 import os
-import shutil
-import logging
-from datetime import datetime, timedelta
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import select, union_all
 from app import app, db
 from models import VideoJob, VideoShort
 
+# Deletes are I/O bound, but a single disk gains little past a few workers
+MAX_DELETE_WORKERS = 8
 
-def cleanup_old_files(days_old=7):
-    """Clean up files older than specified days"""
-    cutoff_date = datetime.utcnow() - timedelta(days=days_old)
 
-    # Directories to clean
-    directories = ['uploads', 'outputs', 'temp']
+def _try_remove(path, size, label):
+    """Remove a file, returning its size on success and 0 on failure"""
+    try:
+        os.remove(path)
+        print(f"Deleted {label}: {path} ({size} bytes)")
+        return size
+    except Exception as e:
+        print(f"Error deleting {path}: {e}")
+        return 0
+
+
+def _remove_files(candidates, label="file"):
+    """Delete (path, size) candidates concurrently and return bytes freed"""
+    if not candidates:
+        return 0
+    workers = min(MAX_DELETE_WORKERS, len(candidates))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [
+            ex.submit(_try_remove, path, size, label)
+            for path, size in candidates
+        ]
+        return sum(f.result() for f in futures)
+
+
+def _collect_db_files():
+    """Index file paths referenced in the database by directory.
+
+    Returns a mapping of normalized directory path to the set of file names
+    referenced in it, so a scan only hashes short names. Must be called
+    inside an application context.
+    """
+    # A single Core query over just the path columns: no ORM objects are
+    # built. Paths are normalized so relative and absolute references match.
+    stmt = union_all(
+        select(VideoJob.video_path),
+        select(VideoJob.audio_path),
+        select(VideoJob.transcript_path),
+        select(VideoShort.output_path),
+        select(VideoShort.thumbnail_path),
+    )
+    # Server-side cursor where supported, so memory stays bounded on large
+    # tables; other backends just fetch in batches
+    stmt = stmt.execution_options(stream_results=True, yield_per=1000)
+    db_index = defaultdict(set)
+    for (path,) in db.session.execute(stmt):
+        if path:
+            dirname, name = os.path.split(os.path.realpath(path))
+            db_index[dirname].add(name)
+    return db_index
+
+
+def _walk_size(path):
+    """Recursively sum file sizes under path using cached DirEntry stats"""
+    total = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                elif entry.is_dir(follow_symlinks=False):
+                    total += _walk_size(entry.path)
+            except OSError:
+                pass
+    return total
+
+
+def _remove_tree(path):
+    """Delete a directory tree and return the number of bytes freed.
+
+    Sizes are tallied in the same scandir pass that unlinks each file, so the
+    tree is traversed once instead of once for sizing and once for rmtree.
+    """
+    freed = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    freed += _remove_tree(entry.path)
+                else:
+                    size = entry.stat(follow_symlinks=False).st_size
+                    os.remove(entry.path)
+                    freed += size
+            except OSError:
+                pass
+    os.rmdir(path)
+    return freed
+
+
+def get_directory_size(directory):
+    """Get total size of directory in bytes"""
+    if not os.path.exists(directory):
+        return 0
+    try:
+        return _walk_size(directory)
+    except OSError:
+        return 0
 
-    total_freed = 0
 
-    for directory in directories:
-        if os.path.exists(directory):
-            print(f"Cleaning {directory}...")
-            for filename in os.listdir(directory):
-                filepath = os.path.join(directory, filename)
-                try:
-                    if os.path.isfile(filepath):
-                        file_time = datetime.fromtimestamp(
-                            os.path.getmtime(filepath))
-                        if file_time < cutoff_date:
-                            file_size = os.path.getsize(filepath)
-                            os.remove(filepath)
-                            total_freed += file_size
-                            print(f"Deleted: {filepath} ({file_size} bytes)")
-                except Exception as e:
-                    print(f"Error deleting {filepath}: {e}")
+def sweep(directory, db_index=None, cutoff_ts=None, purge=False):
+    """Clean a directory in a single scandir pass.
 
-    return total_freed
+    Each entry is stat'ed once and classified as temp (``purge=True``),
+    orphaned (not referenced in ``db_index``, as built by
+    ``_collect_db_files``) or old (``st_mtime`` before the
+    POSIX timestamp ``cutoff_ts``).
+    Returns a dict of freed byte counts plus the directory size before and
+    after the sweep.
+    """
+    stats = {'temp': 0, 'orphan': 0, 'old': 0, 'size_before': 0,
+             'size_after': 0}
+    if not os.path.exists(directory):
+        return stats
+
+    refs = None
+    if db_index is not None:
+        refs = db_index.get(os.path.realpath(directory), frozenset())
+    candidates = {'temp': [], 'orphan': [], 'old': []}
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if purge:
+                        size = _remove_tree(entry.path)
+                        stats['temp'] += size
+                        print(f"Deleted temp directory: {entry.path} ({size} bytes)")
+                    else:
+                        size = _walk_size(entry.path)
+                    stats['size_before'] += size
+                    continue
+
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                st = entry.stat(follow_symlinks=False)
+                stats['size_before'] += st.st_size
+
+                if purge:
+                    action = 'temp'
+                elif refs is not None and entry.name not in refs:
+                    action = 'orphan'
+                elif cutoff_ts is not None and st.st_mtime < cutoff_ts:
+                    action = 'old'
+                else:
+                    continue
+
+                candidates[action].append((entry.path, st.st_size))
+            except OSError as e:
+                print(f"Error reading {entry.path}: {e}")
+
+    for action, files in candidates.items():
+        stats[action] += _remove_files(files, f"{action} file")
+
+    stats['size_after'] = (stats['size_before'] - stats['temp'] -
+                           stats['orphan'] - stats['old'])
+    return stats
+
+
+def cleanup_old_files(days_old=7):
+    """Clean up files older than specified days"""
+    # Compare raw st_mtime floats; no per-file datetime objects needed
+    cutoff_ts = time.time() - timedelta(days=days_old).total_seconds()
+    return sum(sweep(directory, cutoff_ts=cutoff_ts)['old']
+               for directory in ['uploads', 'outputs', 'temp'])
 
 
 def cleanup_orphaned_files():
     """Clean up files not referenced in database"""
     with app.app_context():
-        total_freed = 0
-
-        # Get all file paths from database
-        db_files = set()
-        jobs = VideoJob.query.all()
-        for job in jobs:
-            if job.video_path:
-                db_files.add(job.video_path)
-            if job.audio_path:
-                db_files.add(job.audio_path)
-            if job.transcript_path:
-                db_files.add(job.transcript_path)
-
-        shorts = VideoShort.query.all()
-        for short in shorts:
-            if short.output_path:
-                db_files.add(short.output_path)
-            if short.thumbnail_path:
-                db_files.add(short.thumbnail_path)
-
-        # Check uploads and outputs directories
-        for directory in ['uploads', 'outputs']:
-            if os.path.exists(directory):
-                for filename in os.listdir(directory):
-                    filepath = os.path.join(directory, filename)
-                    if os.path.isfile(filepath) and filepath not in db_files:
-                        try:
-                            file_size = os.path.getsize(filepath)
-                            os.remove(filepath)
-                            total_freed += file_size
-                            print(
-                                f"Deleted orphaned file: {filepath} ({file_size} bytes)"
-                            )
-                        except Exception as e:
-                            print(f"Error deleting {filepath}: {e}")
-
-        return total_freed
+        db_index = _collect_db_files()
+    return sum(sweep(directory, db_index)['orphan']
+               for directory in ['uploads', 'outputs'])
 
 
 def cleanup_temp_directory():
     """Clean up temporary directory completely"""
-    temp_dir = 'temp'
-    total_freed = 0
-
-    if os.path.exists(temp_dir):
-        for filename in os.listdir(temp_dir):
-            filepath = os.path.join(temp_dir, filename)
-            try:
-                if os.path.isfile(filepath):
-                    file_size = os.path.getsize(filepath)
-                    os.remove(filepath)
-                    total_freed += file_size
-                    print(f"Deleted temp file: {filepath} ({file_size} bytes)")
-                elif os.path.isdir(filepath):
-                    dir_size = sum(
-                        os.path.getsize(os.path.join(dirpath, filename))
-                        for dirpath, dirnames, filenames in os.walk(filepath)
-                        for filename in filenames)
-                    shutil.rmtree(filepath)
-                    total_freed += dir_size
-                    print(
-                        f"Deleted temp directory: {filepath} ({dir_size} bytes)"
-                    )
-            except Exception as e:
-                print(f"Error deleting {filepath}: {e}")
-
-    return total_freed
+    return sweep('temp', purge=True)['temp']
 
 
-def get_directory_size(directory):
-    """Get total size of directory in bytes"""
-    total_size = 0
-    if os.path.exists(directory):
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
-                try:
-                    total_size += os.path.getsize(filepath)
-                except:
-                    pass
-    return total_size
+def cleanup_database():
+    """Return free database pages to the filesystem"""
+    with app.app_context():
+        engine = db.engine
+        try:
+            if engine.dialect.name == 'sqlite':
+                # Requires auto_vacuum=INCREMENTAL, set when the DB is created
+                with engine.connect() as conn:
+                    conn.exec_driver_sql(
+                        "PRAGMA incremental_vacuum(1000)").fetchall()
+                    conn.commit()
+                print("Ran SQLite incremental vacuum")
+            elif engine.dialect.name == 'postgresql':
+                # VACUUM cannot run inside a transaction block
+                with engine.connect().execution_options(
+                        isolation_level="AUTOCOMMIT") as conn:
+                    conn.exec_driver_sql("VACUUM (ANALYZE)")
+                print("Ran PostgreSQL VACUUM (ANALYZE)")
+        except Exception as e:
+            print(f"Error vacuuming database: {e}")
 
 
 def format_bytes(bytes_size):
@@ -134,35 +224,41 @@ def format_bytes(bytes_size):
 def main():
     print("=== Disk Space Cleanup ===")
 
-    # Show current usage
-    print("\nCurrent disk usage:")
-    for directory in ['uploads', 'outputs', 'temp']:
-        size = get_directory_size(directory)
-        print(f"{directory}: {format_bytes(size)}")
+    cutoff_ts = time.time() - timedelta(days=7).total_seconds()
+    with app.app_context():
+        db_index = _collect_db_files()
 
-    # Clean temp directory first (safest)
-    print("\n1. Cleaning temporary files...")
-    temp_freed = cleanup_temp_directory()
-    print(f"Freed from temp: {format_bytes(temp_freed)}")
+    # One pass per directory: temp and files staged in trash by the
+    # uploader are purged, uploads/outputs lose orphaned files and files
+    # older than 7 days
+    results = {
+        'temp': sweep('temp', purge=True),
+        'trash': sweep('trash', purge=True),
+        'uploads': sweep('uploads', db_index, cutoff_ts),
+        'outputs': sweep('outputs', db_index, cutoff_ts),
+    }
 
-    # Clean orphaned files
-    print("\n2. Cleaning orphaned files...")
-    orphaned_freed = cleanup_orphaned_files()
-    print(f"Freed from orphaned files: {format_bytes(orphaned_freed)}")
+    print("\nDisk usage before cleanup:")
+    for directory in ['uploads', 'outputs', 'temp', 'trash']:
+        print(f"{directory}: {format_bytes(results[directory]['size_before'])}")
 
-    # Clean old files (7+ days)
-    print("\n3. Cleaning files older than 7 days...")
-    old_freed = cleanup_old_files(7)
+    temp_freed = sum(r['temp'] for r in results.values())
+    orphaned_freed = sum(r['orphan'] for r in results.values())
+    old_freed = sum(r['old'] for r in results.values())
+    print(f"\nFreed from temp and trash: {format_bytes(temp_freed)}")
+    print(f"Freed from orphaned files: {format_bytes(orphaned_freed)}")
     print(f"Freed from old files: {format_bytes(old_freed)}")
 
     total_freed = temp_freed + orphaned_freed + old_freed
     print(f"\nTotal space freed: {format_bytes(total_freed)}")
 
+    print("\nReclaiming free database pages...")
+    cleanup_database()
+
     # Show usage after cleanup
     print("\nDisk usage after cleanup:")
-    for directory in ['uploads', 'outputs', 'temp']:
-        size = get_directory_size(directory)
-        print(f"{directory}: {format_bytes(size)}")
+    for directory in ['uploads', 'outputs', 'temp', 'trash']:
+        print(f"{directory}: {format_bytes(results[directory]['size_after'])}")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
+import hashlib
 import json
 import logging
 import os
-from google import genai
-from google.genai import types
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
 from pydantic import BaseModel
 from typing import List, Dict, Any
 
@@ -20,13 +23,151 @@ class VideoMetadata(BaseModel):
     description: str
     tags: List[str]
 
+GEMINI_MODEL = "gemini-2.5-pro"
+
+SEGMENT_SYSTEM_PROMPT = """You are an expert content analyst specializing in viral social media content and YouTube Shorts.
+
+Analyze the given text segment for its potential to create engaging short-form video content.
+
+Consider these factors:
+- Engagement Score (0.0-1.0): How likely this content is to engage viewers
+- Emotion Score (0.0-1.0): Emotional impact and intensity
+- Viral Potential (0.0-1.0): Likelihood to be shared and go viral
+- Quotability (0.0-1.0): How memorable and quotable the content is
+- Emotions: List of emotions detected (humor, surprise, excitement, inspiration, etc.)
+- Keywords: Important keywords that make this content engaging
+- Reason: Brief explanation of why this segment is engaging
+
+Focus on content that has:
+- Strong emotional hooks
+- Surprising or unexpected elements
+- Humor or entertainment value
+- Inspirational or motivational content
+- Controversial or debate-worthy topics
+- Clear storytelling elements
+- Quotable phrases or moments"""
+
+METADATA_SYSTEM_PROMPT = """You are an expert YouTube content creator specializing in viral Shorts.
+
+Generate engaging metadata for a YouTube Short based on the content segment and original video title.
+
+Guidelines:
+- Title: Create a catchy, clickable title (50-60 characters) that hooks viewers
+- Description: Write an engaging description (100-200 words) with relevant hashtags
+- Tags: Generate 10-15 relevant tags for discoverability
+
+Focus on:
+- Using emotional triggers and curiosity gaps
+- Including trending keywords and hashtags
+- Making titles that encourage clicks
+- Creating descriptions that encourage engagement
+- Using tags that help with YouTube algorithm"""
+
+# Keyword groups for the offline fallback analysis, matched on whole words
+_ENGAGEMENT = frozenset({'amazing', 'incredible', 'wow', 'shocking', 'unbelievable', 'funny', 'hilarious',
+                         'awesome', 'fantastic', 'mind-blowing', 'crazy', 'insane', 'epic', 'legendary'})
+_EMOTION = frozenset({'love', 'hate', 'excited', 'surprised', 'happy', 'angry', 'scared', 'thrilled',
+                      'disappointed', 'frustrated', 'overwhelmed', 'passionate', 'emotional', 'heartwarming'})
+_VIRAL = frozenset({'viral', 'trending', 'share', 'like', 'subscribe', 'follow', 'must-see', 'breaking',
+                    'exclusive', 'revealed', 'secret', 'exposed', 'truth', 'shocking'})
+_QUOTABLE = frozenset({'said', 'quote', 'tells', 'explains', 'reveals', 'admits', 'confesses', 'announces'})
+
+_EMO_HUMOR = frozenset({'funny', 'hilarious', 'joke', 'jokes', 'laugh', 'laughs', 'laughing', 'laughed'})
+_EMO_SURPRISE = frozenset({'shocking', 'surprised', 'unexpected'})
+_EMO_INSPIRATION = frozenset({'love', 'heartwarming', 'beautiful'})
+_EMO_CONTROVERSY = frozenset({'angry', 'frustrated', 'hate'})
+
+# All keywords are found in one regex pass and bucketed by category
+_KEYWORD_GROUPS = {
+    'engagement': _ENGAGEMENT,
+    'emotion': _EMOTION,
+    'viral': _VIRAL,
+    'quotable': _QUOTABLE,
+    'humor': _EMO_HUMOR,
+    'surprise': _EMO_SURPRISE,
+    'inspiration': _EMO_INSPIRATION,
+    'controversy': _EMO_CONTROVERSY,
+}
+_KEYWORD_CATEGORIES = {}
+for _category, _group in _KEYWORD_GROUPS.items():
+    for _kw in _group:
+        _KEYWORD_CATEGORIES.setdefault(_kw, []).append(_category)
+del _category, _group, _kw
+_KEYWORD_RE = re.compile(
+    r"\b(" + "|".join(map(re.escape, sorted(_KEYWORD_CATEGORIES, key=len, reverse=True))) + r")\b")
+
+_COMMON = frozenset({'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+                     'was', 'were', 'a', 'an'})
+
+# Keyword groups for the offline fallback metadata, matched against the
+# token set of a segment
+_TOKEN_RE = re.compile(r"[a-z'-]+")
+
+_META_FUNNY = frozenset({'funny', 'hilarious', 'joke', 'jokes'})
+_META_SHOCKING = frozenset({'shocking', 'unbelievable', 'incredible'})
+_META_AMAZING = frozenset({'amazing', 'awesome', 'fantastic'})
+_META_REVEALED = frozenset({'secret', 'secrets', 'revealed', 'truth'})
+
+_HASHTAG_FUNNY = frozenset({'funny', 'hilarious'})
+_HASHTAG_SHOCKING = frozenset({'shocking', 'unbelievable'})
+_HASHTAG_AMAZING = frozenset({'amazing', 'incredible'})
+
+_TAG_GROUPS = (
+    (frozenset({'funny', 'comedy', 'hilarious'}), ('funny', 'comedy', 'humor')),
+    (frozenset({'music', 'song', 'songs', 'dance', 'dancing'}), ('music', 'song', 'dance')),
+    (frozenset({'food', 'cooking', 'recipe', 'recipes'}), ('food', 'cooking', 'recipe')),
+    (frozenset({'travel', 'adventure'}), ('travel', 'adventure')),
+)
+_BASE_TAGS = ('shorts', 'viral', 'trending', 'entertainment', 'mustsee')
+
+_META_COMMON = _COMMON | {'this', 'that'}
+
+# Number of segment analyses kept in the in-process cache
+SEGMENT_CACHE_SIZE = 1024
+
+SEGMENT_PROMPT = "Analyze this content segment for YouTube Shorts potential:\n\n{text}"
+
+# Segments scored per request by analyze_segments_batch; bounds the size of
+# both the prompt and the JSON array in the reply
+SEGMENT_BATCH_SIZE = 20
+
+SEGMENT_BATCH_PROMPT = """Analyze each of these {count} content segments for YouTube Shorts potential.
+
+Return a JSON array with exactly one analysis per segment, in the same order as the input.
+
+Segments:
+{segments}"""
+
+METADATA_BATCH_PROMPT = """Original video title: {title}
+
+Generate optimized YouTube Shorts metadata for each of these {count} content segments from that video.
+
+Return a JSON array with exactly one entry per segment, in the same order as the input.
+
+Segments:
+{segments}"""
+
 class GeminiAnalyzer:
+    # Shared by all instances, since every job creates its own analyzer
+    _segment_cache = OrderedDict()
+    _segment_cache_lock = threading.Lock()
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.client = None
         self.use_fallback_only = False
         self.api_keys = []
         self.current_key_index = 0
+        # Guards key switching; segment batches are analyzed from worker threads
+        self._failover_lock = threading.Lock()
+        
+        # The google-genai SDK is imported on first client creation, so a
+        # fallback-only setup never pays for loading it
+        self._types = None
+        self._segment_cfg = None
+        self._metadata_cfg = None
+        self._segment_batch_cfg = None
+        self._metadata_batch_cfg = None
         
         # Collect all available API keys
         self._collect_api_keys()
@@ -58,6 +199,33 @@ class GeminiAnalyzer:
         """Initialize client with current API key"""
         if self.current_key_index < len(self.api_keys):
             try:
+                from google import genai
+                from google.genai import types
+
+                if self._types is None:
+                    self._types = types
+                    # Request configs are identical for every call of a given type
+                    self._segment_cfg = types.GenerateContentConfig(
+                        system_instruction=SEGMENT_SYSTEM_PROMPT,
+                        response_mime_type="application/json",
+                        response_schema=SegmentAnalysis,
+                    )
+                    self._metadata_cfg = types.GenerateContentConfig(
+                        system_instruction=METADATA_SYSTEM_PROMPT,
+                        response_mime_type="application/json",
+                        response_schema=VideoMetadata,
+                    )
+                    self._segment_batch_cfg = types.GenerateContentConfig(
+                        system_instruction=SEGMENT_SYSTEM_PROMPT,
+                        response_mime_type="application/json",
+                        response_schema=list[SegmentAnalysis],
+                    )
+                    self._metadata_batch_cfg = types.GenerateContentConfig(
+                        system_instruction=METADATA_SYSTEM_PROMPT,
+                        response_mime_type="application/json",
+                        response_schema=list[VideoMetadata],
+                    )
+
                 api_key = self.api_keys[self.current_key_index]
                 self.client = genai.Client(api_key=api_key)
                 self.logger.info(f"Gemini client initialized with API key #{self.current_key_index + 1}")
@@ -92,6 +260,60 @@ class GeminiAnalyzer:
         self.logger.error(f"API error: {error_msg}")
         return False
 
+    def _call_with_failover(self, cfg, user_text: str) -> Dict[str, Any]:
+        """Send a prompt with a prebuilt config and return the parsed JSON reply.
+
+        Quota errors move on to the next API key and retry; any other error,
+        or running out of keys, is raised to the caller. Safe to call from
+        several threads: they share the current key, and only the first to
+        hit a quota error on it switches to the next.
+        """
+        types = self._types
+        while True:
+            with self._failover_lock:
+                client = self.client
+                key_index = self.current_key_index
+            if client is None:
+                raise Exception("No Gemini API key available")
+            try:
+                response = client.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=[
+                        types.Content(role="user", parts=[types.Part(text=user_text)])
+                    ],
+                    config=cfg,
+                )
+                if not response.text:
+                    raise Exception("Empty response from Gemini")
+                return json.loads(response.text)
+            except Exception as e:
+                with self._failover_lock:
+                    # Another thread may already have switched keys
+                    if self.current_key_index != key_index and not self.use_fallback_only:
+                        continue
+                    if not self._handle_api_error(str(e)) or self.use_fallback_only:
+                        raise
+
+    @staticmethod
+    def _segment_cache_key(text: str) -> bytes:
+        """Hash of the whitespace-normalized segment text"""
+        return hashlib.sha1(" ".join(text.split()).encode("utf-8")).digest()
+
+    def _cached_analysis(self, key: bytes):
+        with self._segment_cache_lock:
+            result = self._segment_cache.get(key)
+            if result is not None:
+                self._segment_cache.move_to_end(key)
+                return dict(result)
+        return None
+
+    def _store_analysis(self, key: bytes, result: Dict[str, Any]):
+        with self._segment_cache_lock:
+            self._segment_cache[key] = result
+            self._segment_cache.move_to_end(key)
+            while len(self._segment_cache) > SEGMENT_CACHE_SIZE:
+                self._segment_cache.popitem(last=False)
+
     def analyze_segment(self, text: str) -> Dict[str, Any]:
         """Analyze a text segment for engagement and viral potential using Gemini"""
         # Check if we should use fallback only
@@ -99,110 +321,97 @@ class GeminiAnalyzer:
             self.logger.info("Using fallback analysis (no Gemini API available)")
             return self._fallback_analysis(text)
         
+        # Reprocessed videos produce identical segments, so skip the round trip
+        cache_key = self._segment_cache_key(text)
+        cached = self._cached_analysis(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            system_prompt = """You are an expert content analyst specializing in viral social media content and YouTube Shorts.
-            
-            Analyze the given text segment for its potential to create engaging short-form video content.
-            
-            Consider these factors:
-            - Engagement Score (0.0-1.0): How likely this content is to engage viewers
-            - Emotion Score (0.0-1.0): Emotional impact and intensity
-            - Viral Potential (0.0-1.0): Likelihood to be shared and go viral
-            - Quotability (0.0-1.0): How memorable and quotable the content is
-            - Emotions: List of emotions detected (humor, surprise, excitement, inspiration, etc.)
-            - Keywords: Important keywords that make this content engaging
-            - Reason: Brief explanation of why this segment is engaging
-            
-            Focus on content that has:
-            - Strong emotional hooks
-            - Surprising or unexpected elements
-            - Humor or entertainment value
-            - Inspirational or motivational content
-            - Controversial or debate-worthy topics
-            - Clear storytelling elements
-            - Quotable phrases or moments"""
+            result = self._call_with_failover(
+                self._segment_cfg, SEGMENT_PROMPT.format(text=text))
+        except Exception as e:
+            self.logger.warning(f"Gemini segment analysis failed, using fallback: {e}")
+            return self._fallback_analysis(text)
 
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"Analyze this content segment for YouTube Shorts potential:\n\n{text}")])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                    response_schema=SegmentAnalysis,
-                ),
-            )
+        analysis = self._segment_result(result)
+        self._store_analysis(cache_key, analysis)
+        return dict(analysis)
+
+    def analyze_segments_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Analyze segments with one request per SEGMENT_BATCH_SIZE segments.
+
+        Results come back in input order. Cached segments are not resent, and
+        any segment the reply doesn't cover gets the fallback analysis.
+        """
+        if self.use_fallback_only or not self.client:
+            self.logger.info("Using fallback analysis (no Gemini API available)")
+            return [self._fallback_analysis(text) for text in texts]
 
-            if response.text:
-                result = json.loads(response.text)
-                return {
-                    'engagement_score': max(0.0, min(1.0, result.get('engagement_score', 0.5))),
-                    'emotion_score': max(0.0, min(1.0, result.get('emotion_score', 0.5))),
-                    'viral_potential': max(0.0, min(1.0, result.get('viral_potential', 0.5))),
-                    'quotability': max(0.0, min(1.0, result.get('quotability', 0.5))),
-                    'emotions': result.get('emotions', [])[:5],  # Limit to 5 emotions
-                    'keywords': result.get('keywords', [])[:10],  # Limit to 10 keywords
-                    'reason': result.get('reason', 'Content has potential for engagement')[:500]
-                }
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            cache_key = self._segment_cache_key(text)
+            cached = self._cached_analysis(cache_key)
+            if cached is not None:
+                results[i] = cached
             else:
-                raise Exception("Empty response from Gemini")
+                pending.append((i, cache_key))
 
-        except Exception as e:
-            error_msg = str(e)
-            
-            # Try to switch to next API key if error is quota-related
-            if self._handle_api_error(error_msg) and not self.use_fallback_only:
-                # Retry with new key
-                try:
-                    response = self.client.models.generate_content(
-                        model="gemini-2.5-pro",
-                        contents=[
-                            types.Content(role="user", parts=[types.Part(text=f"Analyze this content segment for YouTube Shorts potential:\n\n{text}")])
-                        ],
-                        config=types.GenerateContentConfig(
-                            system_instruction=system_prompt,
-                            response_mime_type="application/json",
-                            response_schema=SegmentAnalysis,
-                        ),
-                    )
+        for start in range(0, len(pending), SEGMENT_BATCH_SIZE):
+            batch = pending[start:start + SEGMENT_BATCH_SIZE]
+            segments = json.dumps(
+                [{'segment': n + 1, 'text': texts[i]} for n, (i, _) in enumerate(batch)],
+                ensure_ascii=False, indent=1)
+            prompt = SEGMENT_BATCH_PROMPT.format(count=len(batch), segments=segments)
+            try:
+                reply = self._call_with_failover(self._segment_batch_cfg, prompt)
+                if not isinstance(reply, list):
+                    raise Exception("Expected a JSON array of analyses")
+                if len(reply) != len(batch):
+                    self.logger.warning(
+                        f"Gemini returned {len(reply)} analyses for {len(batch)} segments")
+            except Exception as e:
+                self.logger.warning(f"Gemini batch segment analysis failed, using fallback: {e}")
+                reply = []
 
-                    if response.text:
-                        result = json.loads(response.text)
-                        return {
-                            'engagement_score': max(0.0, min(1.0, result.get('engagement_score', 0.5))),
-                            'emotion_score': max(0.0, min(1.0, result.get('emotion_score', 0.5))),
-                            'viral_potential': max(0.0, min(1.0, result.get('viral_potential', 0.5))),
-                            'quotability': max(0.0, min(1.0, result.get('quotability', 0.5))),
-                            'emotions': result.get('emotions', [])[:5],
-                            'keywords': result.get('keywords', [])[:10],
-                            'reason': result.get('reason', 'Content has potential for engagement')[:500]
-                        }
-                except Exception as retry_e:
-                    self.logger.error(f"Retry with backup key failed: {retry_e}")
-            
-            # Fallback analysis
-            return self._fallback_analysis(text)
+            for n, (i, cache_key) in enumerate(batch):
+                if n < len(reply) and isinstance(reply[n], dict):
+                    analysis = self._segment_result(reply[n])
+                    self._store_analysis(cache_key, analysis)
+                    results[i] = dict(analysis)
+                else:
+                    results[i] = self._fallback_analysis(texts[i])
+
+        return results
+
+    @staticmethod
+    def _segment_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Clamp and trim a raw Gemini segment analysis"""
+        return {
+            'engagement_score': max(0.0, min(1.0, result.get('engagement_score', 0.5))),
+            'emotion_score': max(0.0, min(1.0, result.get('emotion_score', 0.5))),
+            'viral_potential': max(0.0, min(1.0, result.get('viral_potential', 0.5))),
+            'quotability': max(0.0, min(1.0, result.get('quotability', 0.5))),
+            'emotions': result.get('emotions', [])[:5],  # Limit to 5 emotions
+            'keywords': result.get('keywords', [])[:10],  # Limit to 10 keywords
+            'reason': result.get('reason', 'Content has potential for engagement')[:500]
+        }
 
     def _fallback_analysis(self, text: str) -> Dict[str, Any]:
         """Enhanced fallback analysis when Gemini is unavailable"""
         text_lower = text.lower()
         words = text.split()
         
-        # Enhanced keyword categories
-        engagement_keywords = ['amazing', 'incredible', 'wow', 'shocking', 'unbelievable', 'funny', 'hilarious', 
-                              'awesome', 'fantastic', 'mind-blowing', 'crazy', 'insane', 'epic', 'legendary']
-        emotion_keywords = ['love', 'hate', 'excited', 'surprised', 'happy', 'angry', 'scared', 'thrilled',
-                           'disappointed', 'frustrated', 'overwhelmed', 'passionate', 'emotional', 'heartwarming']
-        viral_keywords = ['viral', 'trending', 'share', 'like', 'subscribe', 'follow', 'must-see', 'breaking',
-                         'exclusive', 'revealed', 'secret', 'exposed', 'truth', 'shocking']
-        quotable_keywords = ['said', 'quote', 'tells', 'explains', 'reveals', 'admits', 'confesses', 'announces']
+        # Count distinct keywords per category from a single scan
+        matched = set(_KEYWORD_RE.findall(text_lower))
+        counts = Counter(category for kw in matched for category in _KEYWORD_CATEGORIES[kw])
         
         # Calculate scores based on keyword presence
-        engagement_score = min(1.0, sum(1 for word in engagement_keywords if word in text_lower) * 0.15)
-        emotion_score = min(1.0, sum(1 for word in emotion_keywords if word in text_lower) * 0.15)
-        viral_score = min(1.0, sum(1 for word in viral_keywords if word in text_lower) * 0.2)
-        quotability_score = min(1.0, sum(1 for word in quotable_keywords if word in text_lower) * 0.2)
+        engagement_score = min(1.0, counts['engagement'] * 0.15)
+        emotion_score = min(1.0, counts['emotion'] * 0.15)
+        viral_score = min(1.0, counts['viral'] * 0.2)
+        quotability_score = min(1.0, counts['quotable'] * 0.2)
         
         # Length-based scoring (optimal length for shorts)
         text_length = len(words)
@@ -227,20 +436,14 @@ class GeminiAnalyzer:
         
         # Detect emotions based on keywords
         detected_emotions = []
-        if any(word in text_lower for word in ['funny', 'hilarious', 'joke', 'laugh']):
-            detected_emotions.append('humor')
-        if any(word in text_lower for word in ['shocking', 'surprised', 'unexpected']):
-            detected_emotions.append('surprise')
-        if any(word in text_lower for word in ['love', 'heartwarming', 'beautiful']):
-            detected_emotions.append('inspiration')
-        if any(word in text_lower for word in ['angry', 'frustrated', 'hate']):
-            detected_emotions.append('controversy')
+        for emotion in ('humor', 'surprise', 'inspiration', 'controversy'):
+            if counts[emotion]:
+                detected_emotions.append(emotion)
         if not detected_emotions:
             detected_emotions = ['general']
         
         # Extract meaningful keywords (longer words, excluding common words)
-        common_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'a', 'an'}
-        keywords = [word for word in words if len(word) > 3 and word.lower() not in common_words][:8]
+        keywords = [word for word in words if len(word) > 3 and word.lower() not in _COMMON][:8]
         
         return {
             'engagement_score': engagement_score,
@@ -259,99 +462,81 @@ class GeminiAnalyzer:
             self.logger.info("Using fallback metadata generation (no Gemini API available)")
             return self._fallback_metadata(segment_text, original_title)
             
-        try:
-            system_prompt = """You are an expert YouTube content creator specializing in viral Shorts.
-            
-            Generate engaging metadata for a YouTube Short based on the content segment and original video title.
-            
-            Guidelines:
-            - Title: Create a catchy, clickable title (50-60 characters) that hooks viewers
-            - Description: Write an engaging description (100-200 words) with relevant hashtags
-            - Tags: Generate 10-15 relevant tags for discoverability
-            
-            Focus on:
-            - Using emotional triggers and curiosity gaps
-            - Including trending keywords and hashtags
-            - Making titles that encourage clicks
-            - Creating descriptions that encourage engagement
-            - Using tags that help with YouTube algorithm"""
-
-            prompt = f"""Original video title: {original_title}
+        prompt = f"""Original video title: {original_title}
             
 Content segment: {segment_text}
 
 Generate optimized YouTube Shorts metadata for this content."""
 
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=prompt)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                    response_schema=VideoMetadata,
-                ),
-            )
+        try:
+            result = self._call_with_failover(self._metadata_cfg, prompt)
+        except Exception as e:
+            self.logger.warning(f"Gemini metadata generation failed, using fallback: {e}")
+            return self._fallback_metadata(segment_text, original_title)
 
-            if response.text:
-                result = json.loads(response.text)
-                return {
-                    'title': result.get('title', f"Viral Moment from {original_title}")[:100],
-                    'description': result.get('description', f"Amazing clip from {original_title}\n\n#Shorts #Viral #Trending"),
-                    'tags': result.get('tags', ['shorts', 'viral', 'trending', 'entertainment'])[:15]
-                }
-            else:
-                raise Exception("Empty response from Gemini")
+        return self._metadata_result(result, original_title)
 
+    def generate_metadata_batch(self, segment_texts: List[str], original_title: str) -> List[Dict[str, Any]]:
+        """Generate metadata for all of a video's shorts in one request.
+
+        The original title is sent once rather than with every segment.
+        Results come back in input order, and any segment the reply doesn't
+        cover gets the fallback metadata.
+        """
+        if self.use_fallback_only or not self.client:
+            self.logger.info("Using fallback metadata generation (no Gemini API available)")
+            return [self._fallback_metadata(text, original_title) for text in segment_texts]
+        if not segment_texts:
+            return []
+
+        segments = json.dumps(
+            [{'segment': n + 1, 'text': text} for n, text in enumerate(segment_texts)],
+            ensure_ascii=False, indent=1)
+        prompt = METADATA_BATCH_PROMPT.format(
+            title=original_title, count=len(segment_texts), segments=segments)
+        try:
+            reply = self._call_with_failover(self._metadata_batch_cfg, prompt)
+            if not isinstance(reply, list):
+                raise Exception("Expected a JSON array of metadata")
+            if len(reply) != len(segment_texts):
+                self.logger.warning(
+                    f"Gemini returned {len(reply)} metadata entries for {len(segment_texts)} segments")
         except Exception as e:
-            error_msg = str(e)
-            
-            # Try to switch to next API key if error is quota-related
-            if self._handle_api_error(error_msg) and not self.use_fallback_only:
-                # Retry with new key
-                try:
-                    response = self.client.models.generate_content(
-                        model="gemini-2.5-pro",
-                        contents=[
-                            types.Content(role="user", parts=[types.Part(text=prompt)])
-                        ],
-                        config=types.GenerateContentConfig(
-                            system_instruction=system_prompt,
-                            response_mime_type="application/json",
-                            response_schema=VideoMetadata,
-                        ),
-                    )
+            self.logger.warning(f"Gemini batch metadata generation failed, using fallback: {e}")
+            reply = []
 
-                    if response.text:
-                        result = json.loads(response.text)
-                        return {
-                            'title': result.get('title', f"Viral Moment from {original_title}")[:100],
-                            'description': result.get('description', f"Amazing clip from {original_title}\n\n#Shorts #Viral #Trending"),
-                            'tags': result.get('tags', ['shorts', 'viral', 'trending', 'entertainment'])[:15]
-                        }
-                except Exception as retry_e:
-                    self.logger.error(f"Retry with backup key failed: {retry_e}")
-            
-            return self._fallback_metadata(segment_text, original_title)
+        return [
+            self._metadata_result(reply[n], original_title)
+            if n < len(reply) and isinstance(reply[n], dict)
+            else self._fallback_metadata(text, original_title)
+            for n, text in enumerate(segment_texts)
+        ]
+
+    @staticmethod
+    def _metadata_result(result: Dict[str, Any], original_title: str) -> Dict[str, Any]:
+        """Apply defaults and limits to a raw Gemini metadata reply"""
+        return {
+            'title': result.get('title', f"Viral Moment from {original_title}")[:100],
+            'description': result.get('description', f"Amazing clip from {original_title}\n\n#Shorts #Viral #Trending"),
+            'tags': result.get('tags', ['shorts', 'viral', 'trending', 'entertainment'])[:15]
+        }
 
     def _fallback_metadata(self, segment_text: str, original_title: str) -> Dict[str, Any]:
         """Enhanced fallback metadata generation"""
         words = segment_text.split()
-        text_lower = segment_text.lower()
+        tokens = set(_TOKEN_RE.findall(segment_text.lower()))
         
         # Extract meaningful keywords (exclude common words)
-        common_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'a', 'an', 'this', 'that'}
-        key_words = [word for word in words if len(word) > 3 and word.lower() not in common_words][:5]
+        key_words = [word for word in words if len(word) > 3 and word.lower() not in _META_COMMON][:5]
         
         # Generate title based on content type
-        if any(word in text_lower for word in ['funny', 'hilarious', 'joke']):
+        if tokens & _META_FUNNY:
             title_prefix = "Hilarious"
-        elif any(word in text_lower for word in ['shocking', 'unbelievable', 'incredible']):
+        elif tokens & _META_SHOCKING:
             title_prefix = "Shocking"
-        elif any(word in text_lower for word in ['amazing', 'awesome', 'fantastic']):
+        elif tokens & _META_AMAZING:
             title_prefix = "Amazing"
-        elif any(word in text_lower for word in ['secret', 'revealed', 'truth']):
+        elif tokens & _META_REVEALED:
             title_prefix = "Revealed"
         else:
             title_prefix = "Must See"
@@ -371,31 +556,24 @@ Generate optimized YouTube Shorts metadata for this content."""
         
         # Add relevant hashtags based on content
         hashtags = ["#Shorts", "#Viral", "#MustWatch"]
-        if any(word in text_lower for word in ['funny', 'hilarious']):
+        if tokens & _HASHTAG_FUNNY:
             hashtags.extend(["#Funny", "#Comedy"])
-        if any(word in text_lower for word in ['shocking', 'unbelievable']):
+        if tokens & _HASHTAG_SHOCKING:
             hashtags.extend(["#Shocking", "#Unbelievable"])
-        if any(word in text_lower for word in ['amazing', 'incredible']):
+        if tokens & _HASHTAG_AMAZING:
             hashtags.extend(["#Amazing", "#Incredible"])
         hashtags.extend(["#Trending", "#Entertainment"])
         
         description += " ".join(hashtags)
         
         # Generate tags
-        base_tags = ['shorts', 'viral', 'trending', 'entertainment', 'mustsee']
         content_tags = []
-        
-        if any(word in text_lower for word in ['funny', 'comedy', 'hilarious']):
-            content_tags.extend(['funny', 'comedy', 'humor'])
-        if any(word in text_lower for word in ['music', 'song', 'dance']):
-            content_tags.extend(['music', 'song', 'dance'])
-        if any(word in text_lower for word in ['food', 'cooking', 'recipe']):
-            content_tags.extend(['food', 'cooking', 'recipe'])
-        if any(word in text_lower for word in ['travel', 'adventure']):
-            content_tags.extend(['travel', 'adventure'])
+        for triggers, group_tags in _TAG_GROUPS:
+            if tokens & triggers:
+                content_tags.extend(group_tags)
         
         # Combine all tags
-        all_tags = base_tags + content_tags + key_words[:3]
+        all_tags = list(_BASE_TAGS) + content_tags + key_words[:3]
         
         return {
             'title': title,
@@ -410,17 +588,28 @@ Generate optimized YouTube Shorts metadata for this content."""
             self.logger.info("Video file analysis not available (no Gemini API)")
             return {'analysis': 'Video analysis not available - using audio transcript analysis instead'}
         
+        uploaded = None
         try:
-            with open(video_path, "rb") as f:
-                video_bytes = f.read()
-                
+            # The Files API streams the upload in chunks, so memory use does
+            # not grow with the size of the source video
+            uploaded = self.client.files.upload(
+                file=video_path, config={'mime_type': 'video/mp4'})
+
+            # Videos must finish server-side processing before they can be used
+            deadline = time.monotonic() + 300
+            while uploaded.state and uploaded.state.name == "PROCESSING":
+                if time.monotonic() > deadline:
+                    raise Exception("Timed out waiting for video processing")
+                time.sleep(2)
+                uploaded = self.client.files.get(name=uploaded.name)
+
+            if uploaded.state and uploaded.state.name == "FAILED":
+                raise Exception("Gemini could not process the uploaded video")
+
             response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
+                model=GEMINI_MODEL,
                 contents=[
-                    types.Part.from_bytes(
-                        data=video_bytes,
-                        mime_type="video/mp4",
-                    ),
+                    uploaded,
                     "Analyze this video for engaging moments, emotional highlights, and viral potential. "
                     "Identify the most interesting segments that would work well as YouTube Shorts."
                 ],
@@ -431,3 +620,9 @@ Generate optimized YouTube Shorts metadata for this content."""
         except Exception as e:
             self.logger.error(f"Video file analysis failed: {e}")
             return {'analysis': 'Video analysis not available'}
+        finally:
+            if uploaded is not None:
+                try:
+                    self.client.files.delete(name=uploaded.name)
+                except Exception as e:
+                    self.logger.warning(f"Failed to delete uploaded video file: {e}")
@@ -2,4 +2,9 @@ from app import app
 
 
 if __name__ == '__main__':
+    # The development server is a single process, so it can upgrade the
+    # schema itself; deployments run `flask --app main init-db` once
+    from app import upgrade_schema
+    with app.app_context():
+        upgrade_schema()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,8 +1,12 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from app import db
-from sqlalchemy import Enum, Text, JSON
+from sqlalchemy import DDL, Enum, Text, JSON, and_, event, or_
+from sqlalchemy.dialects.postgresql import JSONB
 import enum
 
+# JSONB on PostgreSQL (binary storage, GIN-indexable); plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), 'postgresql')
+
 class ProcessingStatus(enum.Enum):
     PENDING = "pending"
     DOWNLOADING = "downloading"
@@ -23,15 +27,15 @@ class VideoJob(db.Model):
     __tablename__ = 'video_jobs'
     
     id = db.Column(db.Integer, primary_key=True)
-    youtube_url = db.Column(db.String(500), nullable=False)
+    youtube_url = db.Column(db.String(500), nullable=False, index=True)
     title = db.Column(db.String(200))
     duration = db.Column(db.Integer)  # in seconds
     video_quality = db.Column(db.String(20), default='1080p')
     aspect_ratio = db.Column(db.String(10), default='9:16')
-    user_email = db.Column(db.String(120))
+    user_email = db.Column(db.String(120), index=True)
     
     # Processing status
-    status = db.Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
+    status = db.Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING, index=True)
     progress = db.Column(db.Integer, default=0)
     error_message = db.Column(Text)
     
@@ -41,10 +45,15 @@ class VideoJob(db.Model):
     transcript_path = db.Column(db.String(500))
     
     # Video metadata
-    video_info = db.Column(JSON)
+    video_info = db.Column(JSONType)
+    # Kept in step with video_shorts by the VideoShort insert/delete events
+    shorts_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Shorts not yet uploaded; the uploader decrements it as each upload
+    # completes and cleans up the job's files when it reaches zero
+    pending_shorts = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     # Relationships
@@ -53,6 +62,11 @@ class VideoJob(db.Model):
 
 class VideoShort(db.Model):
     __tablename__ = 'video_shorts'
+    # Serves the results page (filter by job, order by engagement); the
+    # leading job_id column also covers plain job_id lookups
+    __table_args__ = (
+        db.Index('ix_shorts_job_engagement', 'job_id', 'engagement_score'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     job_id = db.Column(db.Integer, db.ForeignKey('video_jobs.id'), nullable=False)
@@ -70,14 +84,14 @@ class VideoShort(db.Model):
     overall_score = db.Column(db.Float, default=0.0)
     
     # Content analysis
-    emotions_detected = db.Column(JSON)
-    keywords = db.Column(JSON)
+    emotions_detected = db.Column(JSONType)
+    keywords = db.Column(JSONType)
     analysis_notes = db.Column(Text)
     
     # Generated content
     title = db.Column(db.String(200))
     description = db.Column(Text)
-    tags = db.Column(JSON)
+    tags = db.Column(JSONType)
     
     # File paths
     output_path = db.Column(db.String(500))
@@ -92,11 +106,70 @@ class VideoShort(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
+    @property
+    def upload_stalled(self):
+        """Whether this short is marked uploading but its worker is gone"""
+        if self.upload_status != UploadStatus.UPLOADING or self.updated_at is None:
+            return False
+        updated_at = self.updated_at
+        if updated_at.tzinfo is None:
+            # Naive datetimes from the database are stored in UTC
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return updated_at < datetime.now(timezone.utc) - UPLOAD_STALE_AFTER
+
+# An upload still marked uploading this long after it was claimed has lost
+# its worker (upload jobs time out after an hour), so it may be claimed again
+UPLOAD_STALE_AFTER = timedelta(hours=2)
+
+def upload_claimable():
+    """SQL condition for shorts an upload worker may claim.
+
+    Anything not yet uploaded and not being uploaded, plus uploads whose
+    claim is older than UPLOAD_STALE_AFTER.
+    """
+    stale_before = datetime.now(timezone.utc) - UPLOAD_STALE_AFTER
+    return or_(
+        VideoShort.upload_status.is_(None),
+        VideoShort.upload_status.not_in(
+            (UploadStatus.UPLOADING, UploadStatus.COMPLETED)),
+        and_(VideoShort.upload_status == UploadStatus.UPLOADING,
+             VideoShort.updated_at < stale_before),
+    )
+
+# Lets keyword filters use JSONB containment (keywords @> '["funny"]');
+# app.py also runs it at startup for tables created before it existed
+KEYWORDS_GIN_INDEX = DDL(
+    "CREATE INDEX IF NOT EXISTS ix_shorts_keywords_gin "
+    "ON video_shorts USING GIN (keywords jsonb_path_ops)")
+event.listen(
+    VideoShort.__table__, 'after_create',
+    KEYWORDS_GIN_INDEX.execute_if(dialect='postgresql'))
+
+def _adjust_shorts_count(connection, target, delta):
+    jobs = VideoJob.__table__
+    values = {'shorts_count': jobs.c.shorts_count + delta}
+    # Uploaded shorts were already taken off the pending count
+    if target.upload_status != UploadStatus.COMPLETED:
+        values['pending_shorts'] = jobs.c.pending_shorts + delta
+    connection.execute(
+        jobs.update()
+        .where(jobs.c.id == target.job_id)
+        .values(**values)
+    )
+
+@event.listens_for(VideoShort, 'after_insert')
+def _increment_shorts_count(mapper, connection, target):
+    _adjust_shorts_count(connection, target, 1)
+
+@event.listens_for(VideoShort, 'after_delete')
+def _decrement_shorts_count(mapper, connection, target):
+    _adjust_shorts_count(connection, target, -1)
+
 class TranscriptSegment(db.Model):
     __tablename__ = 'transcript_segments'
     
     id = db.Column(db.Integer, primary_key=True)
-    job_id = db.Column(db.Integer, db.ForeignKey('video_jobs.id'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('video_jobs.id'), nullable=False, index=True)
     
     # Segment timing
     start_time = db.Column(db.Float, nullable=False)
@@ -111,8 +184,8 @@ class TranscriptSegment(db.Model):
     overall_score = db.Column(db.Float, default=0.0)
     
     # Content analysis
-    emotions_detected = db.Column(JSON)
-    keywords = db.Column(JSON)
+    emotions_detected = db.Column(JSONType)
+    keywords = db.Column(JSONType)
     analysis_notes = db.Column(Text)
     
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
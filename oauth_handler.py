@@ -2,15 +2,46 @@ import os
 import json
 import logging
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import session
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app import db
 from models import YouTubeCredentials
 
 logger = logging.getLogger(__name__)
 
+# Refresh tokens this long before they actually expire
+TOKEN_EXPIRY_MARGIN = timedelta(seconds=60)
+
+# Seconds to wait on any Google OAuth/API endpoint
+HTTP_TIMEOUT = 10
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE
+_UPSERT_INSERTS = {
+    'postgresql': pg_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+def token_usable(expires):
+    """Whether a token expiring at this time can be used without refreshing.
+
+    Naive datetimes (from SQLite or google-auth) are taken as UTC.
+    """
+    if expires is None:
+        return False
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires > datetime.now(timezone.utc) + TOKEN_EXPIRY_MARGIN
+
+
 class OAuthHandler:
     def __init__(self):
         self.client_id = os.environ.get("YOUTUBE_CLIENT_ID")
@@ -35,6 +66,17 @@ class OAuthHandler:
             "https://www.googleapis.com/auth/userinfo.email",
             "https://www.googleapis.com/auth/userinfo.profile"
         ]
+        self.scope_str = ' '.join(self.scopes)
+        
+        # Keep-alive connections to Google; idempotent requests are retried
+        # on transient 5xx errors
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+        )
+        self.http.mount('https://', adapter)
     
     def get_authorization_url(self):
         """Generate OAuth authorization URL"""
@@ -45,7 +87,7 @@ class OAuthHandler:
         auth_params = {
             'client_id': self.client_id,
             'redirect_uri': self.redirect_uri,
-            'scope': ' '.join(self.scopes),
+            'scope': self.scope_str,
             'response_type': 'code',
             'access_type': 'offline',  # To get refresh token
             'prompt': 'consent',  # Force consent to get refresh token
@@ -77,7 +119,7 @@ class OAuthHandler:
         
         try:
             # Get tokens
-            response = requests.post(self.token_uri, data=token_data)
+            response = self.http.post(self.token_uri, data=token_data, timeout=HTTP_TIMEOUT)
             response.raise_for_status()
             token_response = response.json()
             
@@ -88,11 +130,20 @@ class OAuthHandler:
             refresh_token = token_response.get('refresh_token')
             expires_in = token_response.get('expires_in', 3600)
             
-            # Get user info
-            user_info_response = requests.get(
-                self.userinfo_uri,
-                headers={'Authorization': f'Bearer {access_token}'}
-            )
+            # Get user info and YouTube channel info; the two requests are
+            # independent, so run them concurrently
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                user_info_future = executor.submit(
+                    self.http.get,
+                    self.userinfo_uri,
+                    headers={'Authorization': f'Bearer {access_token}'},
+                    timeout=HTTP_TIMEOUT
+                )
+                channel_info_future = executor.submit(self._get_channel_info, access_token)
+                
+                user_info_response = user_info_future.result()
+                channel_info = channel_info_future.result()
+            
             user_info_response.raise_for_status()
             user_info = user_info_response.json()
             
@@ -100,49 +151,59 @@ class OAuthHandler:
             if not user_email:
                 raise Exception("Could not retrieve user email")
             
-            # Get YouTube channel info
-            channel_info = self._get_channel_info(access_token)
-            
             # Calculate token expiry
             token_expires = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
             
             # Store or update credentials
-            existing_creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
-            
-            if existing_creds:
-                # Update existing credentials
-                existing_creds.access_token = access_token
-                if refresh_token:  # Only update if we got a new refresh token
-                    existing_creds.refresh_token = refresh_token
-                existing_creds.token_expires = token_expires
-                existing_creds.scope = ' '.join(self.scopes)
-                existing_creds.updated_at = datetime.now(timezone.utc)
-                
-                if channel_info:
-                    existing_creds.channel_id = channel_info.get('id')
-                    existing_creds.channel_title = channel_info.get('snippet', {}).get('title')
-                    existing_creds.channel_thumbnail = channel_info.get('snippet', {}).get('thumbnails', {}).get('default', {}).get('url')
-                
-                logger.info(f"Updated YouTube credentials for {user_email}")
+            channel_fields = {}
+            if channel_info:
+                snippet = channel_info.get('snippet', {})
+                channel_fields = {
+                    'channel_id': channel_info.get('id'),
+                    'channel_title': snippet.get('title'),
+                    'channel_thumbnail': snippet.get('thumbnails', {}).get('default', {}).get('url'),
+                }
+            
+            values = dict(
+                access_token=access_token,
+                token_expires=token_expires,
+                scope=self.scope_str,
+                updated_at=datetime.now(timezone.utc),
+                **channel_fields
+            )
+            if refresh_token:  # Only update if we got a new refresh token
+                values['refresh_token'] = refresh_token
+            
+            dialect_insert = _UPSERT_INSERTS.get(db.engine.dialect.name)
+            if refresh_token and dialect_insert is not None:
+                # INSERT ... ON CONFLICT (user_email) DO UPDATE: one round trip
+                # and no race between two concurrent callbacks for one user
+                stmt = dialect_insert(YouTubeCredentials).values(
+                    user_email=user_email, **values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['user_email'], set_=values)
+                db.session.execute(stmt)
+                logger.info(f"Stored YouTube credentials for {user_email}")
             else:
-                # Create new credentials
-                if not refresh_token:
-                    raise Exception("No refresh token received - please re-authorize")
+                existing_id = db.session.query(YouTubeCredentials.id).filter_by(
+                    user_email=user_email).limit(1).scalar()
                 
-                new_creds = YouTubeCredentials()
-                new_creds.user_email = user_email
-                new_creds.access_token = access_token
-                new_creds.refresh_token = refresh_token
-                new_creds.token_expires = token_expires
-                new_creds.scope = ' '.join(self.scopes)
-                
-                if channel_info:
-                    new_creds.channel_id = channel_info.get('id')
-                    new_creds.channel_title = channel_info.get('snippet', {}).get('title')
-                    new_creds.channel_thumbnail = channel_info.get('snippet', {}).get('thumbnails', {}).get('default', {}).get('url')
-                
-                db.session.add(new_creds)
-                logger.info(f"Stored new YouTube credentials for {user_email}")
+                if existing_id:
+                    # Update existing credentials in a single UPDATE statement
+                    db.session.execute(
+                        update(YouTubeCredentials)
+                        .where(YouTubeCredentials.id == existing_id)
+                        .values(**values)
+                    )
+                    logger.info(f"Updated YouTube credentials for {user_email}")
+                else:
+                    # Create new credentials
+                    if not refresh_token:
+                        raise Exception("No refresh token received - please re-authorize")
+                    
+                    new_creds = YouTubeCredentials(user_email=user_email, **values)
+                    db.session.add(new_creds)
+                    logger.info(f"Stored new YouTube credentials for {user_email}")
             
             db.session.commit()
             
@@ -170,7 +231,7 @@ class OAuthHandler:
             }
             headers = {'Authorization': f'Bearer {access_token}'}
             
-            response = requests.get(channel_url, params=params, headers=headers)
+            response = self.http.get(channel_url, params=params, headers=headers, timeout=HTTP_TIMEOUT)
             response.raise_for_status()
             
             data = response.json()
@@ -197,7 +258,7 @@ class OAuthHandler:
                 'grant_type': 'refresh_token'
             }
             
-            response = requests.post(self.token_uri, data=token_data)
+            response = self.http.post(self.token_uri, data=token_data, timeout=HTTP_TIMEOUT)
             response.raise_for_status()
             token_response = response.json()
             
@@ -229,7 +290,7 @@ class OAuthHandler:
             
             # Revoke token with Google
             revoke_url = f"https://oauth2.googleapis.com/revoke?token={creds.access_token}"
-            requests.post(revoke_url)
+            self.http.post(revoke_url, timeout=HTTP_TIMEOUT)
             
             # Delete from database
             db.session.delete(creds)
@@ -241,3 +302,13 @@ class OAuthHandler:
         except Exception as e:
             logger.error(f"Failed to revoke tokens: {e}")
             return False
+
+
+_instance = None
+
+def get_oauth_handler():
+    """Return the shared OAuthHandler, creating it on first use"""
+    global _instance
+    if _instance is None:
+        _instance = OAuthHandler()
+    return _instance
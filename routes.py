@@ -1,31 +1,70 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, session, abort
+from sqlalchemy import exists, select
+from sqlalchemy.orm import load_only, raiseload
 from app import app, db
-from models import VideoJob, VideoShort, TranscriptSegment, YouTubeCredentials, ProcessingStatus, UploadStatus
-from oauth_handler import OAuthHandler
-from youtube_uploader import YouTubeUploader
+from models import VideoJob, VideoShort, TranscriptSegment, YouTubeCredentials, ProcessingStatus, UploadStatus, upload_claimable
+from oauth_handler import get_oauth_handler
+from tasks import enqueue_video, enqueue_upload, enqueue_uploads
+import hashlib
 import threading
 import os
 import re
-from video_processor import VideoProcessor
+from urllib.parse import quote
+
+# Anchored and free of ambiguous repetition, so matching is linear in the
+# input. Accepts http(s) or no scheme; www., m. and music. hosts; the watch
+# page with v= anywhere in its query; embed/, v/, shorts/ and live/ paths;
+# youtube-nocookie.com embeds; and youtu.be links.
+_YOUTUBE_URL_RE = re.compile(
+    r'^(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtube\.com/(?:watch\?(?:[^&#]*&)*v=|embed/|v/|shorts/|live/)'
+    r'|youtube-nocookie\.com/embed/|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})(?:[?&#].*)?$'
+)
+
+# Jobs in these states are still being worked on
+ACTIVE_STATUSES = (ProcessingStatus.PENDING, ProcessingStatus.DOWNLOADING,
+                   ProcessingStatus.TRANSCRIBING, ProcessingStatus.ANALYZING,
+                   ProcessingStatus.EDITING, ProcessingStatus.UPLOADING)
+
+# Human-readable text shown while polling a job's status
+STATUS_TEXTS = {
+    ProcessingStatus.PENDING: "Initializing...",
+    ProcessingStatus.DOWNLOADING: "Downloading video in high quality...",
+    ProcessingStatus.TRANSCRIBING: "Extracting audio and transcribing...",
+    ProcessingStatus.ANALYZING: "Analyzing content with Gemini AI...",
+    ProcessingStatus.EDITING: "Generating vertical shorts...",
+    ProcessingStatus.UPLOADING: "Uploading to YouTube...",
+    ProcessingStatus.COMPLETED: "Completed successfully!",
+    ProcessingStatus.FAILED: "Processing failed"
+}
 
 def is_valid_youtube_url(url):
     """Validate if the URL is a valid YouTube URL"""
-    youtube_regex = re.compile(
-        r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-    )
-    return youtube_regex.match(url) is not None
+    return _YOUTUBE_URL_RE.fullmatch(url) is not None
+
+def is_youtube_connected(user_email):
+    """Check whether user_email has stored YouTube credentials"""
+    if not user_email:
+        return False
+    # Set at connect/disconnect time for the logged-in user, so page views
+    # don't need a database round trip
+    if user_email == session.get('user_email') and 'youtube_connected' in session:
+        return session['youtube_connected']
+    return db.session.query(YouTubeCredentials.id).filter_by(
+        user_email=user_email).limit(1).scalar() is not None
 
 @app.route('/')
 def index():
     """Home page with URL input form"""
-    recent_jobs = VideoJob.query.order_by(VideoJob.created_at.desc()).limit(5).all()
+    recent_jobs = VideoJob.query.options(
+        load_only(VideoJob.id, VideoJob.title, VideoJob.status, VideoJob.created_at,
+                  raiseload=True),
+        raiseload('*')
+    ).order_by(VideoJob.created_at.desc()).limit(5).all()
     # Check if user has YouTube credentials
     user_email = session.get('user_email')
-    youtube_connected = False
-    if user_email:
-        creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
-        youtube_connected = creds is not None
+    youtube_connected = is_youtube_connected(user_email)
     
     return render_template('index.html', 
                          recent_jobs=recent_jobs,
@@ -48,15 +87,14 @@ def submit_video():
         return redirect(url_for('index'))
     
     # Check if URL is already being processed
-    existing_job = VideoJob.query.filter_by(youtube_url=youtube_url).filter(
-        VideoJob.status.in_([ProcessingStatus.PENDING, ProcessingStatus.DOWNLOADING, 
-                           ProcessingStatus.TRANSCRIBING, ProcessingStatus.ANALYZING, 
-                           ProcessingStatus.EDITING, ProcessingStatus.UPLOADING])
-    ).first()
+    existing_job_id = db.session.query(VideoJob.id).filter(
+        VideoJob.youtube_url == youtube_url,
+        VideoJob.status.in_(ACTIVE_STATUSES)
+    ).limit(1).scalar()
     
-    if existing_job:
+    if existing_job_id:
         flash('This video is already being processed', 'info')
-        return redirect(url_for('process', job_id=existing_job.id))
+        return redirect(url_for('process', job_id=existing_job_id))
     
     # Create new job
     job = VideoJob()
@@ -67,11 +105,8 @@ def submit_video():
     db.session.add(job)
     db.session.commit()
     
-    # Start processing in background thread
-    processor = VideoProcessor()
-    thread = threading.Thread(target=processor.process_video, args=(job.id,))
-    thread.daemon = True
-    thread.start()
+    # Start processing on a worker (or a background thread without a queue)
+    enqueue_video(job.id)
     
     flash('Video processing started! This may take several minutes.', 'success')
     return redirect(url_for('process', job_id=job.id))
@@ -85,52 +120,72 @@ def process(job_id):
 @app.route('/api/status/<int:job_id>')
 def api_status(job_id):
     """API endpoint to get job status"""
-    job = VideoJob.query.get_or_404(job_id)
-    return jsonify({
-        'status': job.status.value,
-        'progress': job.progress,
-        'error_message': job.error_message,
-        'title': job.title,
-        'shorts_count': len(job.shorts) if job.shorts else 0,
-        'current_status_text': get_status_text(job.status)
-    })
+    # One row with just the polled columns; shorts_count is denormalized
+    # onto the job, so there is no count over video_shorts
+    row = db.session.execute(
+        select(VideoJob.status, VideoJob.progress, VideoJob.updated_at,
+               VideoJob.error_message, VideoJob.title, VideoJob.shorts_count)
+        .where(VideoJob.id == job_id)
+    ).first()
+    if row is None:
+        abort(404)
+    status, progress, updated_at, error_message, title, shorts_count = row
+    
+    # Pollers revalidate with If-None-Match and get a bodiless 304 until
+    # the job actually changes
+    etag = hashlib.md5(
+        f"{status.value}:{progress}:{updated_at}:{shorts_count}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({
+            'status': status.value,
+            'progress': progress,
+            'error_message': error_message,
+            'title': title,
+            'shorts_count': shorts_count,
+            'current_status_text': get_status_text(status)
+        })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 def get_status_text(status):
     """Get human-readable status text"""
-    status_texts = {
-        ProcessingStatus.PENDING: "Initializing...",
-        ProcessingStatus.DOWNLOADING: "Downloading video in high quality...",
-        ProcessingStatus.TRANSCRIBING: "Extracting audio and transcribing...",
-        ProcessingStatus.ANALYZING: "Analyzing content with Gemini AI...",
-        ProcessingStatus.EDITING: "Generating vertical shorts...",
-        ProcessingStatus.UPLOADING: "Uploading to YouTube...",
-        ProcessingStatus.COMPLETED: "Completed successfully!",
-        ProcessingStatus.FAILED: "Processing failed"
-    }
-    return status_texts.get(status, "Unknown status")
+    return STATUS_TEXTS.get(status, "Unknown status")
 
 @app.route('/results/<int:job_id>')
 def results(job_id):
     """Show results page with generated shorts"""
-    job = VideoJob.query.get_or_404(job_id)
+    job = VideoJob.query.options(
+        load_only(VideoJob.id, VideoJob.title, VideoJob.status, VideoJob.user_email,
+                  VideoJob.youtube_url, VideoJob.video_info, VideoJob.created_at,
+                  raiseload=True),
+        raiseload('*')
+    ).get_or_404(job_id)
     
     if job.status != ProcessingStatus.COMPLETED:
         flash('Video processing is not yet complete', 'warning')
         return redirect(url_for('process', job_id=job_id))
     
-    shorts = VideoShort.query.filter_by(job_id=job_id).order_by(VideoShort.engagement_score.desc()).all()
+    shorts = VideoShort.query.options(raiseload('*')).filter_by(job_id=job_id).order_by(VideoShort.engagement_score.desc()).all()
     
     # Check YouTube connection
     user_email = session.get('user_email', job.user_email)
-    youtube_connected = False
-    if user_email:
-        creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
-        youtube_connected = creds is not None
+    youtube_connected = is_youtube_connected(user_email)
+    
+    # Shorts an "upload all" would start: never uploaded, failed, or stalled
+    uploadable_count = sum(
+        1 for short in shorts
+        if short.upload_status not in (UploadStatus.UPLOADING, UploadStatus.COMPLETED)
+        or short.upload_stalled)
     
     return render_template('results.html', 
                          job=job, 
                          shorts=shorts,
-                         youtube_connected=youtube_connected)
+                         youtube_connected=youtube_connected,
+                         uploadable_count=uploadable_count)
 
 @app.route('/download/<int:short_id>')
 def download_short(short_id):
@@ -141,11 +196,34 @@ def download_short(short_id):
         flash('Short video file not found', 'error')
         return redirect(url_for('results', job_id=short.job_id))
     
+    download_name = f"{short.title or 'short'}_{short.id}.mp4"
+    
+    accel_prefix = app.config.get("X_ACCEL_REDIRECT_PREFIX")
+    if accel_prefix:
+        rel_path = os.path.relpath(os.path.realpath(short.output_path),
+                                   os.path.realpath('outputs'))
+        if not rel_path.startswith(os.pardir):
+            # nginx streams the file from its internal location; the worker
+            # only sends headers
+            response = app.response_class(mimetype='video/mp4')
+            response.headers['X-Accel-Redirect'] = (
+                f"{accel_prefix.rstrip('/')}/{quote(rel_path.replace(os.sep, '/'))}"
+            )
+            response.headers['Content-Disposition'] = (
+                f"attachment; filename*=UTF-8''{quote(download_name)}"
+            )
+            return response
+    
+    # conditional=True answers Range and If-None-Match/If-Modified-Since
+    # requests, so seeking and re-downloads don't restream the whole file
     return send_file(
         short.output_path,
         as_attachment=True,
-        download_name=f"{short.title or 'short'}_{short.id}.mp4",
-        mimetype='video/mp4'
+        download_name=download_name,
+        mimetype='video/mp4',
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(short.output_path)
     )
 
 @app.route('/upload_short/<int:short_id>', methods=['POST'])
@@ -158,30 +236,67 @@ def upload_short(short_id):
         flash('Please connect your YouTube account first', 'error')
         return redirect(url_for('youtube_auth'))
     
-    # Check if user has valid YouTube credentials
-    creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
-    if not creds:
+    # Check if user has valid YouTube credentials; an EXISTS probe, since
+    # the row itself isn't needed here
+    has_creds = db.session.scalar(
+        select(exists().where(YouTubeCredentials.user_email == user_email)))
+    if not has_creds:
         flash('Please connect your YouTube account first', 'error')
         return redirect(url_for('youtube_auth'))
     
-    # Start upload in background
-    uploader = YouTubeUploader()
-    thread = threading.Thread(target=uploader.upload_short, args=(short.id, user_email))
-    thread.daemon = True
-    thread.start()
+    # The worker claims the short when it starts; refusing here only stops
+    # a second submit while an upload is running or after it finished. An
+    # upload whose worker died can be started again.
+    if (short.upload_status in (UploadStatus.UPLOADING, UploadStatus.COMPLETED)
+            and not short.upload_stalled):
+        flash('This short is already being uploaded or has been uploaded.', 'info')
+        return redirect(url_for('results', job_id=short.job_id))
     
-    # Update status
-    short.upload_status = UploadStatus.PENDING
-    db.session.commit()
+    # Start upload in background
+    enqueue_upload(short.id, user_email)
     
     flash('Upload started! This may take a few minutes.', 'success')
     return redirect(url_for('results', job_id=short.job_id))
 
+@app.route('/upload_all/<int:job_id>', methods=['POST'])
+def upload_all(job_id):
+    """Upload every short of a job that isn't uploaded or uploading"""
+    job = VideoJob.query.options(
+        load_only(VideoJob.id, VideoJob.user_email, raiseload=True),
+        raiseload('*')
+    ).get_or_404(job_id)
+    user_email = session.get('user_email', job.user_email)
+    
+    if not user_email:
+        flash('Please connect your YouTube account first', 'error')
+        return redirect(url_for('youtube_auth'))
+    
+    has_creds = db.session.scalar(
+        select(exists().where(YouTubeCredentials.user_email == user_email)))
+    if not has_creds:
+        flash('Please connect your YouTube account first', 'error')
+        return redirect(url_for('youtube_auth'))
+    
+    # The worker claims them again, so shorts another upload takes first are
+    # skipped there
+    short_ids = db.session.scalars(
+        select(VideoShort.id).where(VideoShort.job_id == job_id, upload_claimable())
+    ).all()
+    if not short_ids:
+        flash('All shorts are already being uploaded or have been uploaded.', 'info')
+        return redirect(url_for('results', job_id=job_id))
+    
+    # One background job uploads them concurrently
+    enqueue_uploads(short_ids, user_email)
+    
+    flash(f'Upload of {len(short_ids)} shorts started! This may take a few minutes.', 'success')
+    return redirect(url_for('results', job_id=job_id))
+
 @app.route('/youtube/auth')
 def youtube_auth():
     """Start YouTube OAuth process"""
     try:
-        oauth_handler = OAuthHandler()
+        oauth_handler = get_oauth_handler()
         auth_url = oauth_handler.get_authorization_url()
         return redirect(auth_url)
     except Exception as e:
@@ -204,11 +319,12 @@ def youtube_callback():
         return redirect(url_for('index'))
     
     try:
-        oauth_handler = OAuthHandler()
+        oauth_handler = get_oauth_handler()
         result = oauth_handler.exchange_code_for_tokens(code, state)
         
         # Store user email in session
         session['user_email'] = result['email']
+        session['youtube_connected'] = True
         
         flash(f'Successfully connected YouTube account: {result["email"]}', 'success')
         return redirect(url_for('index'))
@@ -226,9 +342,13 @@ def youtube_disconnect():
         return redirect(url_for('index'))
     
     try:
-        oauth_handler = OAuthHandler()
+        oauth_handler = get_oauth_handler()
         oauth_handler.revoke_token(user_email)
+        # Uploads running in this process must not keep using the tokens
+        from youtube_uploader import forget_credentials
+        forget_credentials(user_email)
         session.pop('user_email', None)
+        session.pop('youtube_connected', None)
         flash('YouTube account disconnected successfully', 'success')
     except Exception as e:
         flash(f'Failed to disconnect YouTube account: {str(e)}', 'error')
@@ -239,11 +359,28 @@ def youtube_disconnect():
 def list_jobs():
     """List all processing jobs"""
     page = request.args.get('page', 1, type=int)
-    jobs = VideoJob.query.order_by(VideoJob.created_at.desc()).paginate(
+    # Only the columns jobs.html renders; file paths and other processing
+    # columns stay in the database
+    jobs = VideoJob.query.options(
+        load_only(VideoJob.id, VideoJob.title, VideoJob.status, VideoJob.progress,
+                  VideoJob.created_at, VideoJob.youtube_url, VideoJob.user_email,
+                  VideoJob.error_message, VideoJob.video_info, VideoJob.shorts_count,
+                  raiseload=True)
+    ).order_by(VideoJob.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
     return render_template('jobs.html', jobs=jobs)
 
+def _delete_paths(paths):
+    """Delete files, ignoring ones that are already gone"""
+    for file_path in paths:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            app.logger.warning(f"Could not delete file {file_path}: {e}")
+
 @app.route('/delete/<int:job_id>', methods=['POST'])
 def delete_job(job_id):
     """Delete a job and its associated files"""
@@ -254,20 +391,46 @@ def delete_job(job_id):
     for short in job.shorts:
         files_to_delete.extend([short.output_path, short.thumbnail_path])
     
-    for file_path in files_to_delete:
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                app.logger.warning(f"Could not delete file {file_path}: {e}")
-    
     # Delete from database
     db.session.delete(job)
     db.session.commit()
     
+    # Unlink in the background so the request isn't held up by file I/O;
+    # only once the rows are gone, so a failed commit leaves both in place
+    thread = threading.Thread(target=_delete_paths, args=([p for p in files_to_delete if p],))
+    thread.daemon = True
+    thread.start()
+    
     flash('Job and associated files deleted successfully', 'success')
     return redirect(url_for('index'))
 
+CACHE_FILE_PATTERNS = ('*.pyc', '*.log', '*.tmp')
+
+def _clear_cache_files(root_dir='.'):
+    """Remove __pycache__ directories and cache files in a single tree walk"""
+    import fnmatch
+    import shutil
+    
+    for root, dirs, files in os.walk(root_dir):
+        # Delete matched directories and prune them so the walk never
+        # descends into something it is about to remove
+        if '__pycache__' in dirs:
+            dirs.remove('__pycache__')
+            cache_path = os.path.join(root, '__pycache__')
+            shutil.rmtree(cache_path, ignore_errors=True)
+            app.logger.info(f"Deleted cache: {cache_path}")
+        if '.git' in dirs:
+            dirs.remove('.git')
+        
+        for file_name in files:
+            if any(fnmatch.fnmatch(file_name, pattern) for pattern in CACHE_FILE_PATTERNS):
+                file_path = os.path.join(root, file_name)
+                try:
+                    os.remove(file_path)
+                    app.logger.info(f"Deleted cache file: {file_path}")
+                except OSError as e:
+                    app.logger.warning(f"Could not delete cache file {file_path}: {e}")
+
 @app.route('/clear_all_data', methods=['POST'])
 def clear_all_data():
     """Clear all cache, data files, git folder and database"""
@@ -281,15 +444,25 @@ def clear_all_data():
         # Clear database
         try:
             db.session.close()
+            # Pooled connections keep the old file open and would go on
+            # serving it; close them before the file goes
+            db.engine.dispose()
             db_path = app.config["SQLALCHEMY_DATABASE_URI"].replace('sqlite:///', '')
-            if os.path.exists(db_path):
-                os.remove(db_path)
-                app.logger.info(f"Deleted database: {db_path}")
+            # WAL mode keeps recent writes in the -wal file beside the database
+            for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+                    app.logger.info(f"Deleted database: {path}")
+            session.pop('youtube_connected', None)
         except Exception as e:
             app.logger.warning(f"Could not delete database: {e}")
         
+        # Cached tokens go with the stored credentials
+        from youtube_uploader import forget_credentials
+        forget_credentials()
+        
         # Clear directories
-        directories_to_clear = ['uploads', 'outputs', 'temp']
+        directories_to_clear = ['uploads', 'outputs', 'temp', 'trash']
         for directory in directories_to_clear:
             if os.path.exists(directory):
                 shutil.rmtree(directory)
@@ -301,22 +474,10 @@ def clear_all_data():
             shutil.rmtree('.git')
             app.logger.info("Deleted .git folder")
         
-        # Clear any cache files
-        cache_patterns = ['*.pyc', '__pycache__', '*.log', '*.tmp']
-        for pattern in cache_patterns:
-            if pattern == '__pycache__':
-                for root, dirs, files in os.walk('.'):
-                    for dir_name in dirs:
-                        if dir_name == '__pycache__':
-                            cache_path = os.path.join(root, dir_name)
-                            shutil.rmtree(cache_path)
-                            app.logger.info(f"Deleted cache: {cache_path}")
-            else:
-                import glob
-                for file_path in glob.glob(pattern):
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        app.logger.info(f"Deleted cache file: {file_path}")
+        # Clear any cache files; this walks the whole project tree, so it
+        # runs in the background instead of holding up the response
+        thread = threading.Thread(target=_clear_cache_files, daemon=True)
+        thread.start()
         
         # Recreate database tables
         with app.app_context():
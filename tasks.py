@@ -0,0 +1,97 @@
+"""Background work dispatch.
+
+When REDIS_URL is set, jobs are pushed onto RQ queues and run by separate
+worker processes (``rq worker video uploads``), so web workers only insert
+the row and enqueue. Without it, work runs on a daemon thread in the web
+process as before.
+"""
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+VIDEO_QUEUE = 'video'
+UPLOAD_QUEUE = 'uploads'
+
+# Downloads and transcoding of long videos can take a while
+VIDEO_JOB_TIMEOUT = '2h'
+UPLOAD_JOB_TIMEOUT = '1h'
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def _get_queue(name):
+    """Return the RQ queue for name, or None when no queue is configured"""
+    if not REDIS_URL:
+        return None
+    with _queues_lock:
+        if name not in _queues:
+            try:
+                from redis import Redis
+                from rq import Queue
+            except ImportError:
+                logger.warning("REDIS_URL is set but rq/redis are not installed; using threads")
+                return None
+            _queues[name] = Queue(name, connection=Redis.from_url(REDIS_URL))
+        return _queues[name]
+
+
+def process_video(job_id):
+    """Worker entry point for processing a video job"""
+    # Imported here so workers and the web app don't import each other at load time
+    from video_processor import VideoProcessor
+    VideoProcessor().process_video(job_id)
+
+
+def _in_rq_job():
+    """Whether this call is running as an RQ job, in a short-lived work horse"""
+    try:
+        from rq import get_current_job
+    except ImportError:
+        return False
+    return get_current_job() is not None
+
+
+def upload_short(short_id, user_email):
+    """Worker entry point for uploading a short to YouTube"""
+    from youtube_uploader import YouTubeUploader
+    YouTubeUploader(drain_trash=_in_rq_job()).upload_short(short_id, user_email)
+
+
+def upload_shorts(short_ids, user_email):
+    """Worker entry point for uploading several shorts concurrently"""
+    from youtube_uploader import YouTubeUploader
+    YouTubeUploader(drain_trash=_in_rq_job()).upload_shorts_batch(short_ids, user_email)
+
+
+def _dispatch(queue_name, func, args, job_timeout):
+    queue = _get_queue(queue_name)
+    if queue is not None:
+        try:
+            queue.enqueue(func, *args, job_timeout=job_timeout)
+            return
+        except Exception as e:
+            logger.error(f"Failed to enqueue {func.__name__}{args}, running in a thread: {e}")
+
+    thread = threading.Thread(target=func, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+def enqueue_video(job_id):
+    """Start processing a video job in the background"""
+    _dispatch(VIDEO_QUEUE, process_video, (job_id,), VIDEO_JOB_TIMEOUT)
+
+
+def enqueue_upload(short_id, user_email):
+    """Start uploading a short in the background"""
+    _dispatch(UPLOAD_QUEUE, upload_short, (short_id, user_email), UPLOAD_JOB_TIMEOUT)
+
+
+def enqueue_uploads(short_ids, user_email):
+    """Start uploading several shorts in the background"""
+    _dispatch(UPLOAD_QUEUE, upload_shorts, (list(short_ids), user_email), UPLOAD_JOB_TIMEOUT)
@@ -0,0 +1,28 @@
+"""Shared test setup: a throwaway in-memory database and the app around it"""
+import os
+
+# Forced, not defaulted, and set before app is imported: the fixtures drop
+# and recreate every table, which must never touch a real DATABASE_URL
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("YOUTUBE_CLIENT_ID", "test-client-id")
+os.environ.setdefault("YOUTUBE_CLIENT_SECRET", "test-client-secret")
+
+import pytest
+
+from app import app, db
+
+
+@pytest.fixture
+def database():
+    """Empty tables, inside an app context for the length of the test"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+
+
+@pytest.fixture
+def client(database):
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
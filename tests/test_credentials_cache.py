@@ -0,0 +1,73 @@
+"""Cached YouTube credentials: eviction and write-back of refreshed tokens"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.auth.exceptions import RefreshError
+
+from app import db
+from models import YouTubeCredentials
+import youtube_uploader
+from youtube_uploader import YouTubeUploader, forget_credentials, _is_auth_error
+
+EMAIL = "user@example.com"
+
+
+@pytest.fixture
+def uploader(database):
+    db.session.add(YouTubeCredentials(
+        user_email=EMAIL, access_token="old-token", refresh_token="refresh",
+        token_expires=datetime.now(timezone.utc) + timedelta(hours=1)))
+    db.session.commit()
+    forget_credentials()
+    yield YouTubeUploader()
+    forget_credentials()
+
+
+def test_cached_until_forgotten(uploader):
+    creds = uploader._get_valid_credentials(EMAIL)
+    assert uploader._get_valid_credentials(EMAIL) is creds
+    forget_credentials(EMAIL)
+    assert uploader._get_valid_credentials(EMAIL) is not creds
+
+
+def test_token_refreshed_in_place_is_saved(uploader):
+    creds = uploader._get_valid_credentials(EMAIL)
+    creds.token = "new-token"
+    youtube_uploader._save_refreshed_token(EMAIL)
+    db.session.commit()
+    db.session.expire_all()
+    row = YouTubeCredentials.query.filter_by(user_email=EMAIL).one()
+    assert row.access_token == "new-token"
+
+
+def test_wrapped_refresh_error_is_auth_error():
+    try:
+        try:
+            raise RefreshError("invalid_grant")
+        except RefreshError as e:
+            raise Exception(f"Video upload failed: {e}")
+    except Exception as e:
+        assert _is_auth_error(e)
+    assert not _is_auth_error(Exception("quota exceeded"))
+
+
+def test_refresh_is_written_by_the_outcome_commit(uploader, monkeypatch):
+    from google.oauth2.credentials import Credentials
+
+    row = YouTubeCredentials.query.filter_by(user_email=EMAIL).one()
+    row.token_expires = datetime.now(timezone.utc) - timedelta(minutes=5)
+    db.session.commit()
+
+    def refresh(self, request):
+        self.token = "refreshed-token"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+    monkeypatch.setattr(Credentials, "refresh", refresh)
+
+    assert uploader._get_valid_credentials(EMAIL).token == "refreshed-token"
+    # A failed upload rolls back first; the token is still written after
+    db.session.rollback()
+    youtube_uploader._save_refreshed_token(EMAIL)
+    db.session.commit()
+    db.session.expire_all()
+    row = YouTubeCredentials.query.filter_by(user_email=EMAIL).one()
+    assert row.access_token == "refreshed-token"
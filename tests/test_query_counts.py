@@ -0,0 +1,86 @@
+"""Query-count guards for the hot read routes.
+
+Every column the templates need is in the route's load_only(raiseload=True)
+list, so a page renders with a fixed number of statements however many
+jobs or shorts there are; touching anything else raises instead of quietly
+issuing one SELECT per row.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db
+from models import VideoJob, VideoShort, ProcessingStatus
+
+with app.app_context():
+    engine = db.engine
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _make_job(shorts=0):
+    job = VideoJob(youtube_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                   title="Test video", status=ProcessingStatus.COMPLETED,
+                   video_info={"duration": 600, "width": 1920, "height": 1080,
+                               "uploader": "someone", "view_count": 1})
+    db.session.add(job)
+    db.session.flush()
+    for i in range(shorts):
+        db.session.add(VideoShort(job_id=job.id, start_time=i * 30.0,
+                                  end_time=i * 30.0 + 20.0, duration=20.0,
+                                  title=f"Short {i}", overall_score=0.5,
+                                  engagement_score=0.5))
+    db.session.commit()
+    return job.id
+
+
+@pytest.mark.parametrize("jobs", [1, 5])
+def test_index_query_count(client, jobs):
+    with app.app_context():
+        for _ in range(jobs):
+            _make_job()
+    with count_queries() as statements:
+        response = client.get("/")
+    assert response.status_code == 200
+    assert len(statements) == 1
+
+
+@pytest.mark.parametrize("shorts", [1, 5])
+def test_results_query_count(client, shorts):
+    with app.app_context():
+        job_id = _make_job(shorts)
+    with count_queries() as statements:
+        response = client.get(f"/results/{job_id}")
+    assert response.status_code == 200
+    # The job and its shorts; no user is connected, so no credentials probe
+    assert len(statements) == 2
+
+
+def test_api_status_query_count(client):
+    with app.app_context():
+        job_id = _make_job(3)
+    with count_queries() as statements:
+        response = client.get(f"/api/status/{job_id}")
+    assert response.status_code == 200
+    assert response.get_json()["shorts_count"] == 3
+    assert len(statements) == 1
+
+    etag = response.headers["ETag"]
+    with count_queries() as statements:
+        response = client.get(f"/api/status/{job_id}",
+                              headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(statements) == 1
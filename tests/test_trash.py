@@ -0,0 +1,44 @@
+"""Staged deletes: files moved to trash/ and emptied by the janitor or inline"""
+import os
+
+import youtube_uploader
+from youtube_uploader import YouTubeUploader, TRASH_DIR
+
+
+def _make_files(directory, count):
+    os.makedirs(directory)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'short_{i}.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'x')
+        paths.append(path)
+    return paths
+
+
+def test_drain_trash_deletes_before_returning(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    woken = []
+    monkeypatch.setattr(youtube_uploader, '_wake_janitor', lambda: woken.append(1))
+    paths = _make_files('outputs', 3)
+
+    removed = YouTubeUploader(drain_trash=True)._delete_files(paths, 7)
+
+    assert sorted(removed) == sorted(paths)
+    assert not any(os.path.exists(path) for path in paths)
+    assert not os.path.exists(os.path.join(TRASH_DIR, '7'))
+    assert not woken
+
+
+def test_janitor_gets_staged_files_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    woken = []
+    monkeypatch.setattr(youtube_uploader, '_wake_janitor', lambda: woken.append(1))
+    paths = _make_files('outputs', 2)
+
+    YouTubeUploader()._delete_files(paths, 8)
+
+    assert woken
+    assert len(os.listdir(os.path.join(TRASH_DIR, '8'))) == 2
+    youtube_uploader._empty_trash()
+    assert not os.path.exists(os.path.join(TRASH_DIR, '8'))
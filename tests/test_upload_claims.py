@@ -0,0 +1,75 @@
+"""Upload claims: the conditional UPDATE in YouTubeUploader._claim_uploads"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import app, db
+from models import VideoJob, VideoShort, UploadStatus, UPLOAD_STALE_AFTER
+from youtube_uploader import YouTubeUploader
+
+
+@pytest.fixture
+def shorts(database):
+    job = VideoJob(youtube_url="https://youtu.be/dQw4w9WgXcQ")
+    db.session.add(job)
+    db.session.flush()
+    stale = datetime.now(timezone.utc) - UPLOAD_STALE_AFTER - timedelta(minutes=1)
+    rows = {
+        'pending': VideoShort(job_id=job.id, start_time=0, end_time=20),
+        'failed': VideoShort(job_id=job.id, start_time=0, end_time=20,
+                             upload_status=UploadStatus.FAILED),
+        'uploading': VideoShort(job_id=job.id, start_time=0, end_time=20,
+                                upload_status=UploadStatus.UPLOADING),
+        'stalled': VideoShort(job_id=job.id, start_time=0, end_time=20,
+                              upload_status=UploadStatus.UPLOADING,
+                              updated_at=stale),
+        'completed': VideoShort(job_id=job.id, start_time=0, end_time=20,
+                                upload_status=UploadStatus.COMPLETED),
+    }
+    db.session.add_all(rows.values())
+    db.session.commit()
+    yield {name: short.id for name, short in rows.items()}
+
+
+def test_claims_only_unclaimed_or_stalled(shorts):
+    with app.app_context():
+        claimed = YouTubeUploader()._claim_uploads(list(shorts.values()))
+        assert sorted(claimed) == sorted(
+            [shorts['pending'], shorts['failed'], shorts['stalled']])
+        for name in ('pending', 'failed', 'stalled'):
+            short = db.session.get(VideoShort, shorts[name])
+            assert short.upload_status == UploadStatus.UPLOADING
+            assert not short.upload_stalled
+
+
+def test_second_claim_gets_nothing(shorts):
+    with app.app_context():
+        uploader = YouTubeUploader()
+        assert uploader._claim_uploads([shorts['pending']]) == [shorts['pending']]
+        assert uploader._claim_uploads([shorts['pending']]) == []
+
+
+def test_stalled_flag(shorts):
+    with app.app_context():
+        assert db.session.get(VideoShort, shorts['stalled']).upload_stalled
+        assert not db.session.get(VideoShort, shorts['uploading']).upload_stalled
+
+
+def test_upload_all_enqueues_claimable_shorts(shorts, monkeypatch):
+    import routes
+    from models import YouTubeCredentials
+
+    enqueued = []
+    monkeypatch.setattr(routes, 'enqueue_uploads',
+                        lambda ids, email: enqueued.append((sorted(ids), email)))
+    with app.app_context():
+        job = db.session.get(VideoShort, shorts['pending']).job
+        job.user_email = "user@example.com"
+        db.session.add(YouTubeCredentials(user_email=job.user_email, access_token="token"))
+        db.session.commit()
+        job_id = job.id
+
+    response = app.test_client().post(f'/upload_all/{job_id}')
+    assert response.status_code == 302
+    assert enqueued == [(sorted([shorts['pending'], shorts['failed'], shorts['stalled']]),
+                         "user@example.com")]
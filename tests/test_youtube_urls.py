@@ -0,0 +1,39 @@
+"""What is_valid_youtube_url accepts before a job is created"""
+import pytest
+
+from routes import is_valid_youtube_url
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"http://youtube.com/watch?v={VIDEO_ID}",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"www.youtube.com/watch?v={VIDEO_ID}&t=42s",
+    f"https://www.youtube.com/watch?feature=share&v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}&list=RDAMVM",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}?start=10",
+    f"https://youtube.com/v/{VIDEO_ID}",
+    f"https://youtube.com/shorts/{VIDEO_ID}?si=abc",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"youtu.be/{VIDEO_ID}#t=5",
+])
+def test_accepts(url):
+    assert is_valid_youtube_url(url)
+
+
+@pytest.mark.parametrize("url", [
+    "",
+    "https://example.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=short",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQextra",
+    "https://www.youtube.com/channel/UCxyz",
+    "https://youtube.com.evil.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?" + "a&" * 5000,
+])
+def test_rejects(url):
+    assert not is_valid_youtube_url(url)
@@ -2,11 +2,356 @@ import os
 import logging
 import yt_dlp
 import subprocess
+import html
 import json
+import re
+import threading
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from types import MappingProxyType, SimpleNamespace
+from sqlalchemy import select
 from app import app, db
 from models import VideoJob, VideoShort, TranscriptSegment, ProcessingStatus
-from gemini_analyzer import GeminiAnalyzer
+from gemini_analyzer import GeminiAnalyzer, SEGMENT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# faster-whisper model; large-v3 is the most accurate, smaller sizes
+# (medium, small) trade accuracy for speed on CPU-only hosts
+WHISPER_MODEL_SIZE = os.environ.get("WHISPER_MODEL", "large-v3")
+WHISPER_BATCH_SIZE = 16
+
+# Device and precision default to CUDA/float16 when a GPU is present and
+# CPU/int8 otherwise; either can be forced (e.g. WHISPER_COMPUTE_TYPE=int8_float16
+# to save GPU memory)
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE")
+WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE")
+
+# Transcript segments are merged into windows of about this many seconds,
+# the unit Gemini scores and shorts are cut from
+SEGMENT_LENGTH = 30
+
+# faster-whisper's bundled Silero VAD drops silence before the encoder;
+# padding keeps word onsets/endings at chunk edges. The chunk length is
+# passed to transcribe() as chunk_length, since the batched pipeline
+# overrides max_speech_duration_s with it (popping it from the dict it is
+# given, so each call gets a copy)
+VAD_PARAMETERS = MappingProxyType({
+    'min_silence_duration_ms': 500,
+    'speech_pad_ms': 500,
+})
+
+# Converts signed 16-bit PCM samples to floats in [-1, 1)
+_PCM16_SCALE = np.float32(1.0 / 32768.0)
+
+# Analysis columns copied from a transcript segment onto its short
+SEGMENT_SCORE_FIELDS = ('engagement_score', 'emotion_score', 'viral_potential',
+                        'quotability', 'overall_score', 'emotions_detected',
+                        'keywords', 'analysis_notes')
+
+# Weights of engagement, emotion, viral potential and quotability in a
+# segment's overall score
+SCORE_COMPONENTS = ('engagement_score', 'emotion_score', 'viral_potential',
+                    'quotability')
+SCORE_WEIGHTS = np.array([0.3, 0.2, 0.3, 0.2])
+
+# Segments scoring above this with a usable length become shorts
+MIN_OVERALL_SCORE = 0.4
+MAX_SHORTS = 5
+
+# Loading the model is expensive, so it is shared by every processor
+_whisper_pipeline = None
+_whisper_lock = threading.Lock()
+
+
+def _get_whisper_pipeline():
+    """Load the batched faster-whisper pipeline once per process"""
+    global _whisper_pipeline
+    with _whisper_lock:
+        if _whisper_pipeline is None:
+            import ctranslate2
+            from faster_whisper import BatchedInferencePipeline, WhisperModel
+            device = WHISPER_DEVICE or (
+                "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu")
+            compute_type = WHISPER_COMPUTE_TYPE or (
+                "float16" if device == "cuda" else "int8")
+            model = WhisperModel(WHISPER_MODEL_SIZE,
+                                 device=device,
+                                 compute_type=compute_type)
+            _whisper_pipeline = BatchedInferencePipeline(model=model)
+        return _whisper_pipeline
+
+
+def _vtt_seconds(timestamp):
+    """Convert a WebVTT timestamp ([hh:]mm:ss.ttt) to seconds"""
+    seconds = 0.0
+    for part in timestamp.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _parse_vtt(text):
+    """Parse WebVTT captions into [{'start', 'end', 'text'}] cues"""
+    cues = []
+    for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        for n, line in enumerate(lines):
+            match = _VTT_TIMING_RE.search(line)
+            if match:
+                cue_text = ' '.join(
+                    _VTT_TAG_RE.sub('', cue_line) for cue_line in lines[n + 1:])
+                cue_text = html.unescape(' '.join(cue_text.split()))
+                if cue_text:
+                    cues.append({
+                        'start': _vtt_seconds(match.group(1)),
+                        'end': _vtt_seconds(match.group(2)),
+                        'text': cue_text
+                    })
+                break
+    return cues
+
+
+def _merge_segments(segments, max_length=SEGMENT_LENGTH):
+    """Coalesce consecutive transcript segments into ~max_length windows.
+
+    Windows are yielded as soon as they are complete, so a lazy input (such
+    as a running transcription) can be consumed while it is produced.
+    """
+    current = None
+    for segment in segments:
+        if current is None:
+            current = dict(segment)
+        elif segment['end'] - current['start'] > max_length:
+            yield current
+            current = dict(segment)
+        else:
+            current['end'] = segment['end']
+            current['text'] = f"{current['text']} {segment['text']}"
+    if current is not None:
+        yield current
+
+
+# Audio stream language/title indicators. Latin codes must stand alone
+# ("hi-IN" but not "chinese"); \b can't be used because Devanagari vowel
+# signs aren't word characters
+HINDI_RE = re.compile(r'(?<![a-z])(?:hi|hin|hindi)(?![a-z])|हिंदी|हिन्दी',
+                      re.IGNORECASE)
+ENGLISH_RE = re.compile(r'(?<![a-z])(?:en|eng|english)(?![a-z])',
+                        re.IGNORECASE)
+
+# yt-dlp format selectors per requested quality (force 1920x1080 for 1080p/best)
+QUALITY_FORMATS = MappingProxyType({
+    '1080p':
+    '137+140/bestvideo[height=1080]+bestaudio[ext=m4a]/bestvideo[height>=1080]+bestaudio/best[height>=1080]/best',
+    '720p':
+    '136+140/bestvideo[height=720]+bestaudio[ext=m4a]/bestvideo[height>=720]+bestaudio/best[height>=720]/best',
+    '480p':
+    'bestvideo[height=480]+bestaudio[ext=m4a]/bestvideo[height>=480]+bestaudio/best[height>=480]/best',
+    'best':
+    '137+140/bestvideo[height=1080]+bestaudio[ext=m4a]/bestvideo[height>=1080]+bestaudio/best'
+})
+
+# yt-dlp options shared by every download; the format selector and output
+# template are added per job
+_BASE_YDL_OPTS = MappingProxyType({
+    'extractaudio':
+    False,
+    'noplaylist':
+    True,
+    'writesubtitles':
+    False,
+    'writeautomaticsub':
+    False,
+    'merge_output_format':
+    'mp4',  # Force mp4 output
+    'postprocessors': [{
+        'key': 'FFmpegVideoConvertor',
+        'preferedformat': 'mp4',
+    }],
+    'prefer_ffmpeg':
+    True,  # Use ffmpeg for processing
+    'format_sort': ['res:1080', 'ext:mp4:m4a',
+                    'vcodec:h264'],  # Prefer 1080p, mp4, and h264
+    'verbose':
+    False,  # Disable verbose logging
+    # Custom format selector for audio language priority
+    'format_sort_force':
+    True,
+    # Age restriction bypass options
+    'age_limit':
+    99,  # Allow all age-restricted content
+    'skip_download':
+    False,
+    'cookiefile':
+    None,  # Will be set if cookies file exists
+    # Additional options for age-restricted content
+    'extractor_args': {
+        'youtube': {
+            'skip': ['hls', 'dash'],  # Skip problematic formats
+            'player_skip': ['configs'],
+        }
+    }
+})
+
+# Uploaded caption languages used instead of Whisper, in order of
+# preference (matching the audio stream priority); regional variants
+# such as en-US count too
+CAPTION_LANGUAGES = ('hi', 'en')
+CAPTION_TIMEOUT = 30
+
+_VTT_TIMING_RE = re.compile(
+    r'((?:\d+:)?\d{1,2}:\d{2}\.\d{3})\s+-->\s+((?:\d+:)?\d{1,2}:\d{2}\.\d{3})')
+_VTT_TAG_RE = re.compile(r'<[^>]+>')
+
+# Container extensions yt-dlp may leave the downloaded video in
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.avi')
+
+# Source audio codecs that are copied into the shorts without re-encoding
+COPYABLE_AUDIO_CODECS = frozenset({'aac'})
+
+# Only errors go to stderr: no banner, per-frame progress or config dump
+# piling up in the pipe during long encodes
+FFMPEG_QUIET_ARGS = ('-hide_banner', '-nostats', '-loglevel', 'error')
+
+# Encoder settings for the vertical shorts; NVENC is used when ffmpeg was
+# built with it, with libx264 as the fallback
+X264_ARGS = ('-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23')
+NVENC_ARGS = ('-c:v', 'h264_nvenc', '-preset', 'p4', '-tune', 'hq', '-rc',
+              'vbr', '-cq', '23', '-b:v', '0')
+
+# Thumbnails are a 640x1136 frame from one second into each short
+THUMBNAIL_FILTER = 'scale=640:1136:force_original_aspect_ratio=increase,crop=640:1136'
+
+# None until ffmpeg's encoder list has been checked
+_nvenc_available = None
+_nvenc_lock = threading.Lock()
+
+
+def _use_nvenc():
+    """Whether ffmpeg has the h264_nvenc encoder, checked once per process"""
+    global _nvenc_available
+    with _nvenc_lock:
+        if _nvenc_available is None:
+            try:
+                result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                        capture_output=True,
+                                        text=True)
+                _nvenc_available = 'h264_nvenc' in result.stdout
+            except OSError:
+                _nvenc_available = False
+            if _nvenc_available:
+                logger.info("Using NVENC hardware encoding for shorts")
+        return _nvenc_available
+
+
+def _disable_nvenc():
+    """Stop using NVENC, e.g. when it is built in but no GPU is usable"""
+    global _nvenc_available
+    with _nvenc_lock:
+        _nvenc_available = False
+
+
+def _extract_thumbnail(video_path, thumbnail_path):
+    """Grab the thumbnail frame from a finished short; True if it was written"""
+    result = subprocess.run([
+        'ffmpeg', *FFMPEG_QUIET_ARGS, '-ss', '1', '-i', video_path,
+        '-vf', THUMBNAIL_FILTER, '-frames:v', '1', '-an', '-y', thumbnail_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        logger.warning(f"Failed to generate thumbnail: {result.stderr[-500:]}")
+        return False
+    return True
+
+
+def create_vertical_video(input_path,
+                          output_path,
+                          start_time,
+                          end_time,
+                          thumbnail_path=None,
+                          audio_stream=None,
+                          audio_codec=None):
+    """Create vertical 9:16 video from horizontal source using FFmpeg.
+
+    If thumbnail_path is given, a 640x1136 frame from one second into the
+    short is written by the same ffmpeg run. The thumbnail is best-effort:
+    if that output fails the short is encoded without it and the frame is
+    grabbed from the finished file instead. Returns whether a thumbnail was
+    written. audio_stream selects which audio stream to keep; when its
+    audio_codec can go into MP4 as-is it is copied instead of re-encoded.
+    """
+    try:
+        duration = end_time - start_time
+
+        stream_args = []
+        if audio_stream is not None:
+            stream_args = ['-map', '0:v:0', '-map', f'0:a:{audio_stream}']
+        if audio_codec in COPYABLE_AUDIO_CODECS:
+            audio_args = ['-c:a', 'copy']
+        else:
+            audio_args = ['-c:a', 'aac', '-b:a', '128k']
+
+        def build_cmd(codec_args, with_thumbnail):
+            # FFmpeg command to create vertical video. Seeking before -i jumps
+            # to the nearest keyframe instead of decoding everything up to the
+            # cut (still frame-accurate when re-encoding); two threads each
+            # so parallel encodes don't oversubscribe the cores
+            cmd = [
+                'ffmpeg', *FFMPEG_QUIET_ARGS, '-ss',
+                str(start_time), '-i', input_path, '-t',
+                str(duration), *stream_args, '-vf',
+                'scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920',
+                *codec_args, '-threads', '2', *audio_args, '-movflags',
+                '+faststart', '-y', output_path
+            ]
+            if with_thumbnail:
+                # Second output from the same decode instead of reopening
+                # and re-seeking the finished short
+                cmd += [
+                    '-ss', '1', '-vf', THUMBNAIL_FILTER,
+                    '-frames:v', '1', '-an', '-y', thumbnail_path
+                ]
+            return cmd
+
+        def encode(codec_args):
+            """Run the encode; returns the result and whether it wrote the thumbnail"""
+            result = subprocess.run(build_cmd(codec_args, bool(thumbnail_path)),
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE,
+                                    text=True)
+            if result.returncode == 0 or not thumbnail_path:
+                return result, result.returncode == 0 and bool(thumbnail_path)
+            # Don't let the thumbnail output sink the short
+            retry = subprocess.run(build_cmd(codec_args, False),
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE,
+                                   text=True)
+            if retry.returncode == 0:
+                logger.warning(
+                    f"Thumbnail output failed, encoded without it: {result.stderr[-500:]}")
+            return retry, False
+
+        result = None
+        if _use_nvenc():
+            result, has_thumbnail = encode(NVENC_ARGS)
+            if result.returncode != 0:
+                logger.warning(
+                    f"NVENC encode failed, falling back to libx264: {result.stderr[-500:]}")
+                _disable_nvenc()
+                result = None
+        if result is None:
+            result, has_thumbnail = encode(X264_ARGS)
+
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg failed: {result.stderr}")
+
+    except Exception as e:
+        raise Exception(f"Failed to create vertical video: {e}")
+
+    if thumbnail_path and not has_thumbnail:
+        has_thumbnail = _extract_thumbnail(output_path, thumbnail_path)
+    return has_thumbnail
 
 
 class VideoProcessor:
@@ -15,15 +360,25 @@ class VideoProcessor:
         self.logger = logging.getLogger(__name__)
         self.gemini_analyzer = GeminiAnalyzer()
         self.whisper_model = None
+        # Parsed ffprobe output and chosen audio stream per video path
+        self._probe_cache = {}
+        self._audio_stream_cache = {}
+        # (language, url) of the uploaded caption track found at download time
+        self._caption_track = None
 
     def load_whisper_model(self):
         """Load Whisper model for transcription"""
         if self.whisper_model is None:
             try:
-                # Use ffmpeg for basic audio extraction and create mock transcription
-                # This avoids the Whisper dependency issue while maintaining functionality
+                self.whisper_model = _get_whisper_pipeline()
+                self.logger.info(
+                    f"Loaded faster-whisper model: {WHISPER_MODEL_SIZE}")
+            except ImportError:
+                # Without faster-whisper, fall back to time-based placeholder
+                # segments so the rest of the pipeline still works
                 self.whisper_model = "ffmpeg_based"
-                self.logger.info("Audio processing initialized")
+                self.logger.warning(
+                    "faster-whisper not installed, using time-based segments")
             except Exception as e:
                 self.logger.error(
                     f"Failed to initialize audio processing: {e}")
@@ -84,62 +439,12 @@ class VideoProcessor:
         output_dir = 'uploads'
 
         # Configure yt-dlp options for high quality download (force 1920x1080)
-        quality_formats = {
-            '1080p':
-            '137+140/bestvideo[height=1080]+bestaudio[ext=m4a]/bestvideo[height>=1080]+bestaudio/best[height>=1080]/best',
-            '720p':
-            '136+140/bestvideo[height=720]+bestaudio[ext=m4a]/bestvideo[height>=720]+bestaudio/best[height>=720]/best',
-            '480p':
-            'bestvideo[height=480]+bestaudio[ext=m4a]/bestvideo[height>=480]+bestaudio/best[height>=480]/best',
-            'best':
-            '137+140/bestvideo[height=1080]+bestaudio[ext=m4a]/bestvideo[height>=1080]+bestaudio/best'
-        }
-
-        format_selector = quality_formats.get(job.video_quality,
-                                              quality_formats['1080p'])
-
         ydl_opts = {
+            **_BASE_YDL_OPTS,
             'format':
-            format_selector,
+            QUALITY_FORMATS.get(job.video_quality, QUALITY_FORMATS['1080p']),
             'outtmpl':
             os.path.join(output_dir, f'video_{job.id}_%(title)s.%(ext)s'),
-            'extractaudio':
-            False,
-            'noplaylist':
-            True,
-            'writesubtitles':
-            False,
-            'writeautomaticsub':
-            False,
-            'merge_output_format':
-            'mp4',  # Force mp4 output
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }],
-            'prefer_ffmpeg':
-            True,  # Use ffmpeg for processing
-            'format_sort': ['res:1080', 'ext:mp4:m4a',
-                            'vcodec:h264'],  # Prefer 1080p, mp4, and h264
-            'verbose':
-            False,  # Disable verbose logging
-            # Custom format selector for audio language priority
-            'format_sort_force':
-            True,
-            # Age restriction bypass options
-            'age_limit':
-            99,  # Allow all age-restricted content
-            'skip_download':
-            False,
-            'cookiefile':
-            None,  # Will be set if cookies file exists
-            # Additional options for age-restricted content
-            'extractor_args': {
-                'youtube': {
-                    'skip': ['hls', 'dash'],  # Skip problematic formats
-                    'player_skip': ['configs'],
-                }
-            }
         }
 
         try:
@@ -151,8 +456,9 @@ class VideoProcessor:
                     "Using cookies file for age-restricted content")
 
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Extract info first to get title and duration
-                info = ydl.extract_info(job.youtube_url, download=False)
+                # One extractor run both downloads the video and returns
+                # its info dict
+                info = ydl.extract_info(job.youtube_url, download=True)
                 job.title = info.get('title', 'Unknown Title')[:200]
                 job.duration = info.get('duration', 0)
                 job.video_info = {
@@ -166,19 +472,13 @@ class VideoProcessor:
                 }
                 db.session.commit()
 
-                # Download the video
-                ydl.download([job.youtube_url])
+                # Uploaded (human) captions make Whisper unnecessary
+                self._caption_track = self._pick_caption_track(info)
 
                 # Find the downloaded video file
-                video_files = []
-                for file in os.listdir(output_dir):
-                    if file.startswith(f'video_{job.id}_') and file.endswith(
-                        ('.mp4', '.webm', '.mkv', '.avi')):
-                        video_files.append(file)
-
-                if video_files:
-                    video_file = video_files[0]
-                    video_path = os.path.join(output_dir, video_file)
+                video_path = self._find_downloaded_video(job, output_dir, info)
+
+                if video_path:
                     job.video_path = video_path
                     db.session.commit()
                     self.logger.info(f"Downloaded video: {video_path}")
@@ -189,67 +489,158 @@ class VideoProcessor:
         except Exception as e:
             raise Exception(f"Failed to download video: {e}")
 
-    def _transcribe_video(self, job, video_path):
-        """Transcribe video using Whisper"""
+    def _collect_and_prefetch(self, windows):
+        """Collect transcript windows while Gemini scores the finished ones.
+
+        Whisper yields segments as it goes, so each full batch of windows is
+        sent for analysis on a worker thread while transcription continues.
+        The results land in the analyzer's segment cache, which is where
+        _analyze_content then finds them.
+        """
+        segments = []
+        batch = []
+        futures = []
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for window in windows:
+                segments.append(window)
+                # Same filter as the segments stored for analysis
+                if len(window['text'].strip()) > 10:
+                    batch.append(window['text'].strip())
+                if len(batch) == SEGMENT_BATCH_SIZE:
+                    futures.append(executor.submit(
+                        self.gemini_analyzer.analyze_segments_batch, batch))
+                    batch = []
+            if batch:
+                futures.append(executor.submit(
+                    self.gemini_analyzer.analyze_segments_batch, batch))
+        # A failed prefetch only loses the head start; _analyze_content
+        # scores whatever isn't cached
+        for future in futures:
+            error = future.exception()
+            if error is not None:
+                self.logger.warning(f"Segment analysis prefetch failed: {error}")
+        return segments
+
+    def _find_downloaded_video(self, job, output_dir, info=None):
+        """Return the path yt-dlp wrote the job's video to, or None"""
+        # yt-dlp reports the final (post-merge) path of each download
+        if info:
+            for download in info.get('requested_downloads') or []:
+                filepath = download.get('filepath')
+                if filepath and os.path.exists(filepath):
+                    return filepath
+
+        # Otherwise stop at the first file matching the output template
+        prefix = f'video_{job.id}_'
+        with os.scandir(output_dir) as it:
+            return next((entry.path for entry in it
+                         if entry.name.startswith(prefix)
+                         and entry.name.endswith(VIDEO_EXTENSIONS)), None)
+
+    def _pick_caption_track(self, info):
+        """Return (language, url) of the preferred uploaded WebVTT captions.
+
+        Only the uploader's subtitles are considered, not YouTube's automatic
+        captions. Returns None when there are none in CAPTION_LANGUAGES.
+        """
+        subtitles = info.get('subtitles') or {}
+        for preferred in CAPTION_LANGUAGES:
+            for language, tracks in subtitles.items():
+                if language != preferred and not language.startswith(
+                        f'{preferred}-'):
+                    continue
+                for track in tracks:
+                    if track.get('ext') == 'vtt' and track.get('url'):
+                        return language, track['url']
+        return None
+
+    def _load_captions(self):
+        """Fetch and parse the caption track, or return None to use Whisper"""
+        if not self._caption_track:
+            return None
+        language, url = self._caption_track
         try:
-            # Load Whisper model
-            self.load_whisper_model()
-
-            # Extract audio for Whisper with Hindi language preference
-            audio_path = os.path.join('temp', f'audio_{job.id}.wav')
+            response = requests.get(url, timeout=CAPTION_TIMEOUT)
+            response.raise_for_status()
+            cues = _parse_vtt(response.text)
+        except Exception as e:
+            self.logger.warning(
+                f"Could not load '{language}' captions, using Whisper: {e}")
+            return None
+        if not cues:
+            return None
+        self.logger.info(f"Using uploaded '{language}' captions: {len(cues)} cues")
+        return language, cues
 
+    def _transcribe_video(self, job, video_path):
+        """Transcribe video from uploaded captions, falling back to Whisper"""
+        try:
             # Detect and prioritize audio streams: Hindi first, then English, then default
-            audio_stream_index = self._select_preferred_audio_stream(
+            # The same probe also gives the container duration
+            audio_stream_index, probed_duration = self._select_preferred_audio_stream(
                 video_path)
 
-            # Extract audio with preferred stream
-            cmd = [
-                'ffmpeg',
-                '-i',
-                video_path,
-                f'-map',
-                f'0:a:{audio_stream_index}',  # Select specific audio stream
-                '-vn',
-                '-acodec',
-                'pcm_s16le',
-                '-ar',
-                '16000',
-                '-ac',
-                '1',
-                '-y',
-                audio_path
-            ]
-            subprocess.run(cmd, check=True, capture_output=True)
-
-            # Use ffmpeg to get duration and create time-based segments for AI analysis
-            duration_cmd = [
-                'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
-                '-of', 'csv=p=0', video_path
-            ]
-            duration_result = subprocess.run(duration_cmd,
-                                             capture_output=True,
-                                             text=True)
-            duration = float(duration_result.stdout.strip())
-
-            # Create time-based segments (every 30 seconds) for AI analysis
-            segment_length = 30  # seconds
-            segments = []
-            for i in range(0, int(duration), segment_length):
-                end_time = min(i + segment_length, duration)
-                segments.append({
-                    'start':
-                    i,
-                    'end':
-                    end_time,
-                    'text':
-                    f"Audio segment from {i}s to {end_time}s"  # Placeholder for AI analysis
-                })
+            captions = self._load_captions()
+            if not captions:
+                # Load Whisper model
+                self.load_whisper_model()
+
+            if captions:
+                # Captions already have text and timings; no audio decode
+                # or Whisper pass is needed
+                language, cues = captions
+                segments = self._collect_and_prefetch(_merge_segments(cues))
+                duration = probed_duration or (segments[-1]['end']
+                                               if segments else 0)
+                full_text = " ".join(segment['text'] for segment in segments)
+            elif self.whisper_model != "ffmpeg_based":
+                # Decode the preferred stream straight into memory; no WAV
+                # file is written and read back
+                audio = self._decode_audio(video_path, audio_stream_index)
+
+                # One batched pass over the speech regions found by VAD,
+                # packed into chunks of at most SEGMENT_LENGTH seconds
+                whisper_segments, info = self.whisper_model.transcribe(
+                    audio,
+                    batch_size=WHISPER_BATCH_SIZE,
+                    chunk_length=SEGMENT_LENGTH,
+                    vad_filter=True,
+                    vad_parameters=dict(VAD_PARAMETERS),
+                    word_timestamps=False)
+                segments = self._collect_and_prefetch(
+                    _merge_segments({
+                        'start': segment.start,
+                        'end': segment.end,
+                        'text': segment.text.strip()
+                    } for segment in whisper_segments))
+                duration = info.duration
+                language = info.language
+                full_text = " ".join(segment['text'] for segment in segments)
+            else:
+                # Use the probed duration to create time-based segments for AI analysis
+                if probed_duration is None:
+                    raise Exception("Could not determine video duration")
+                duration = probed_duration
+
+                # Create time-based segments (every 30 seconds) for AI analysis
+                segments = []
+                for i in range(0, int(duration), SEGMENT_LENGTH):
+                    end_time = min(i + SEGMENT_LENGTH, duration)
+                    segments.append({
+                        'start':
+                        i,
+                        'end':
+                        end_time,
+                        'text':
+                        f"Audio segment from {i}s to {end_time}s"  # Placeholder for AI analysis
+                    })
+                language = 'en'
+                full_text = f"Video content with {len(segments)} segments for AI analysis"
 
             transcript_data = {
                 'segments': segments,
-                'language': 'en',
-                'full_text':
-                f"Video content with {len(segments)} segments for AI analysis",
+                'language': language,
+                'full_text': full_text,
                 'duration': duration
             }
 
@@ -259,20 +650,20 @@ class VideoProcessor:
             with open(transcript_path, 'w') as f:
                 json.dump(transcript_data, f, indent=2)
 
-            job.audio_path = audio_path
             job.transcript_path = transcript_path
-            db.session.commit()
 
-            # Store segments in database
+            # Store segments in database with one executemany INSERT
+            rows = []
             for segment in segments:
                 if len(segment['text'].strip()
                        ) > 10:  # Only meaningful segments
-                    transcript_segment = TranscriptSegment()
-                    transcript_segment.job_id = job.id
-                    transcript_segment.start_time = segment['start']
-                    transcript_segment.end_time = segment['end']
-                    transcript_segment.text = segment['text'].strip()
-                    db.session.add(transcript_segment)
+                    rows.append({
+                        'job_id': job.id,
+                        'start_time': segment['start'],
+                        'end_time': segment['end'],
+                        'text': segment['text'].strip()
+                    })
+            db.session.bulk_insert_mappings(TranscriptSegment, rows)
 
             db.session.commit()
             return transcript_data
@@ -280,59 +671,119 @@ class VideoProcessor:
         except Exception as e:
             raise Exception(f"Failed to transcribe video: {e}")
 
+    def _decode_audio(self, video_path, audio_stream_index):
+        """Decode an audio stream to 16 kHz mono float32 samples for Whisper"""
+        cmd = [
+            'ffmpeg',
+            *FFMPEG_QUIET_ARGS,
+            '-i',
+            video_path,
+            '-map',
+            f'0:a:{audio_stream_index}',  # Select specific audio stream
+            '-vn',
+            '-f',
+            's16le',
+            '-acodec',
+            'pcm_s16le',
+            '-ar',
+            '16000',
+            '-ac',
+            '1',
+            '-'
+        ]
+        # stdout carries the PCM samples; stderr only has errors now
+        result = subprocess.run(cmd,
+                                check=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        # Scale in float32 directly instead of going through float64
+        return np.frombuffer(result.stdout, dtype=np.int16).astype(
+            np.float32) * _PCM16_SCALE
+
+    def _load_segments(self, job):
+        """Load a job's transcript segments as plain records.
+
+        Only the columns analysis and short generation use are selected, and
+        no ORM objects are created, so later commits don't expire and reload
+        each segment.
+        """
+        rows = db.session.execute(
+            select(TranscriptSegment.id, TranscriptSegment.start_time,
+                   TranscriptSegment.end_time, TranscriptSegment.text,
+                   *(getattr(TranscriptSegment, field)
+                     for field in SEGMENT_SCORE_FIELDS)).where(
+                         TranscriptSegment.job_id == job.id).order_by(
+                             TranscriptSegment.id)).all()
+        return [SimpleNamespace(**row._asdict()) for row in rows]
+
     def _analyze_content(self, job, transcript_data):
         """Analyze content with Gemini AI to find engaging segments"""
         try:
-            segments = TranscriptSegment.query.filter_by(job_id=job.id).all()
-            engaging_segments = []
+            segments = self._load_segments(job)
 
-            for segment in segments:
-                # Analyze segment with Gemini
-                analysis = self.gemini_analyzer.analyze_segment(segment.text)
+            # Score all segments in as few Gemini requests as possible
+            analyses = self.gemini_analyzer.analyze_segments_batch(
+                [segment.text for segment in segments])
+
+            # Weighted overall score for every segment in one matrix product
+            scores = np.array([[
+                analysis.get(component, 0.0) for component in SCORE_COMPONENTS
+            ] for analysis in analyses]).reshape(-1, len(SCORE_COMPONENTS))
+            overall = scores @ SCORE_WEIGHTS
 
+            for segment, analysis, row, score in zip(segments, analyses,
+                                                    scores.tolist(),
+                                                    overall.tolist()):
                 # Update segment with AI scores
-                segment.engagement_score = analysis.get(
-                    'engagement_score', 0.0)
-                segment.emotion_score = analysis.get('emotion_score', 0.0)
-                segment.viral_potential = analysis.get('viral_potential', 0.0)
-                segment.quotability = analysis.get('quotability', 0.0)
-                segment.overall_score = (segment.engagement_score * 0.3 +
-                                         segment.emotion_score * 0.2 +
-                                         segment.viral_potential * 0.3 +
-                                         segment.quotability * 0.2)
+                (segment.engagement_score, segment.emotion_score,
+                 segment.viral_potential, segment.quotability) = row
+                segment.overall_score = score
                 segment.emotions_detected = analysis.get('emotions', [])
                 segment.keywords = analysis.get('keywords', [])
                 segment.analysis_notes = analysis.get('reason', '')
 
-                # Consider segments with good scores and appropriate duration
-                duration = segment.end_time - segment.start_time
-                if (segment.overall_score > 0.4 and  # Lowered threshold
-                        10 <= duration <= 60 and  # Expanded duration range
-                        len(segment.text.split()) >= 5):  # Lowered word count
-                    engaging_segments.append(segment)
-
+            # Write every segment's scores in one executemany UPDATE
+            db.session.bulk_update_mappings(TranscriptSegment, [
+                dict(id=segment.id,
+                     **{
+                         field: getattr(segment, field)
+                         for field in SEGMENT_SCORE_FIELDS
+                     }) for segment in segments
+            ])
             db.session.commit()
 
-            # Sort by overall score and return top segments
-            engaging_segments.sort(key=lambda x: x.overall_score, reverse=True)
+            # Consider segments with good scores and appropriate duration
+            durations = np.array(
+                [segment.end_time - segment.start_time for segment in segments])
+            word_counts = np.array(
+                [len(segment.text.split()) for segment in segments])
+            eligible = ((overall > MIN_OVERALL_SCORE) &
+                        (durations >= 10) & (durations <= 60) &  # Expanded duration range
+                        (word_counts >= 5))  # Lowered word count
+
+            # Top segments by overall score; the stable sort keeps transcript
+            # order between equal scores
+            eligible_idx = np.flatnonzero(eligible)
+            ranked = eligible_idx[np.argsort(-overall[eligible_idx],
+                                             kind='stable')]
+            engaging_segments = [segments[i] for i in ranked[:MAX_SHORTS]]
 
             # Ensure we have at least one segment - if not, add the best available segment
             if not engaging_segments:
-                all_segments = TranscriptSegment.query.filter_by(
-                    job_id=job.id).all()
-                for segment in all_segments:
+                for segment in segments:
                     duration = segment.end_time - segment.start_time
                     if 10 <= duration <= 60 and len(segment.text.split()) >= 3:
                         segment.overall_score = 0.3  # Low but acceptable score
                         engaging_segments.append(segment)
                         break
 
-            return engaging_segments[:5]  # Return top 5 segments
+            return engaging_segments
 
         except Exception as e:
             self.logger.error(f"Content analysis failed: {e}")
+            db.session.rollback()
             # Fallback: return segments based on duration
-            segments = TranscriptSegment.query.filter_by(job_id=job.id).all()
+            segments = self._load_segments(job)
             fallback_segments = []
             for segment in segments:
                 duration = segment.end_time - segment.start_time
@@ -344,106 +795,105 @@ class VideoProcessor:
     def _generate_shorts(self, job, video_path, engaging_segments):
         """Generate vertical short videos from engaging segments"""
         try:
-            for i, segment in enumerate(engaging_segments):
+            # Generate metadata for every short with one Gemini request;
+            # the job title is shared, so it is only sent once
+            all_metadata = self.gemini_analyzer.generate_metadata_batch(
+                [segment.text for segment in engaging_segments],
+                job.title or "YouTube Short")
+
+            shorts = []
+            for i, (segment, metadata) in enumerate(
+                    zip(engaging_segments, all_metadata)):
                 try:
-                    # Generate metadata with Gemini
-                    metadata = self.gemini_analyzer.generate_metadata(
-                        segment.text, job.title or "YouTube Short")
-
                     # Create VideoShort record
-                    short = VideoShort()
-                    short.job_id = job.id
-                    short.start_time = segment.start_time
-                    short.end_time = segment.end_time
-                    short.duration = segment.end_time - segment.start_time
-                    short.engagement_score = segment.engagement_score
-                    short.emotion_score = segment.emotion_score
-                    short.viral_potential = segment.viral_potential
-                    short.quotability = segment.quotability
-                    short.overall_score = segment.overall_score
-                    short.emotions_detected = segment.emotions_detected
-                    short.keywords = segment.keywords
-                    short.analysis_notes = segment.analysis_notes
-                    short.title = metadata.get('title', f"Short {i+1}")
-                    short.description = metadata.get('description', '')
-                    short.tags = metadata.get('tags', [])
-
-                    db.session.add(short)
-                    db.session.commit()
-
-                    # Generate video file
-                    output_path = os.path.join('outputs',
-                                               f'short_{short.id}.mp4')
-                    thumbnail_path = os.path.join(
-                        'outputs', f'short_{short.id}_thumb.jpg')
-
-                    # Create vertical video using FFmpeg
-                    self._create_vertical_video(video_path, output_path,
-                                                segment.start_time,
-                                                segment.end_time)
-
-                    # Generate thumbnail
-                    self._generate_thumbnail(output_path, thumbnail_path)
-
-                    # Update short with file paths
-                    short.output_path = output_path
-                    short.thumbnail_path = thumbnail_path
-                    db.session.commit()
-
-                    self.logger.info(f"Generated short {i+1}: {output_path}")
+                    short = VideoShort(
+                        job_id=job.id,
+                        start_time=segment.start_time,
+                        end_time=segment.end_time,
+                        duration=segment.end_time - segment.start_time,
+                        title=metadata.get('title', f"Short {i+1}"),
+                        description=metadata.get('description', ''),
+                        tags=metadata.get('tags', []),
+                        **{
+                            field: getattr(segment, field)
+                            for field in SEGMENT_SCORE_FIELDS
+                        })
+                    shorts.append((i, segment, short))
 
                 except Exception as e:
                     self.logger.error(f"Failed to generate short {i+1}: {e}")
                     continue
 
-        except Exception as e:
-            raise Exception(f"Failed to generate shorts: {e}")
-
-    def _create_vertical_video(self, input_path, output_path, start_time,
-                               end_time):
-        """Create vertical 9:16 video from horizontal source using FFmpeg"""
-        try:
-            duration = end_time - start_time
-
-            # FFmpeg command to create vertical video
-            cmd = [
-                'ffmpeg', '-i', input_path, '-ss',
-                str(start_time), '-t',
-                str(duration), '-vf',
-                'scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920',
-                '-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-c:a',
-                'aac', '-b:a', '128k', '-movflags', '+faststart', '-y',
-                output_path
-            ]
+            if not shorts:
+                return
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # A single flush assigns every id and a single commit stores
+            # all the rows
+            db.session.add_all([short for _, _, short in shorts])
+            db.session.flush()
+            pending = [(i, segment, short.id) for i, segment, short in shorts]
+            db.session.commit()
 
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg failed: {result.stderr}")
+            # Each short is an independent ffmpeg process, so encode them
+            # side by side; DB writes stay on this thread's session
+            workers = max(1, min(len(pending), (os.cpu_count() or 2) // 2))
+            # Keep the audio stream transcription used; probed once already
+            audio_stream, audio_codec = self._audio_stream_codec(video_path)
+            file_paths = []
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for i, segment, short_id in pending:
+                    output_path = os.path.join('outputs',
+                                               f'short_{short_id}.mp4')
+                    thumbnail_path = os.path.join(
+                        'outputs', f'short_{short_id}_thumb.jpg')
+                    # The thumbnail comes out of the same ffmpeg run, or
+                    # is left unset if it couldn't be made
+                    future = executor.submit(create_vertical_video,
+                                             video_path, output_path,
+                                             segment.start_time,
+                                             segment.end_time, thumbnail_path,
+                                             audio_stream, audio_codec)
+                    futures[future] = (i, short_id, output_path,
+                                       thumbnail_path)
+
+                for future in as_completed(futures):
+                    i, short_id, output_path, thumbnail_path = futures[future]
+                    try:
+                        has_thumbnail = future.result()
+
+                        file_paths.append({
+                            'id': short_id,
+                            'output_path': output_path,
+                            'thumbnail_path': thumbnail_path if has_thumbnail else None
+                        })
 
-        except Exception as e:
-            raise Exception(f"Failed to create vertical video: {e}")
+                        self.logger.info(
+                            f"Generated short {i+1}: {output_path}")
 
-    def _generate_thumbnail(self, video_path, thumbnail_path):
-        """Generate thumbnail from video"""
-        try:
-            cmd = [
-                'ffmpeg', '-i', video_path, '-ss', '00:00:01.000', '-vframes',
-                '1', '-s', '640x1136', '-y', thumbnail_path
-            ]
+                    except Exception as e:
+                        self.logger.error(
+                            f"Failed to generate short {i+1}: {e}")
+                        continue
 
-            subprocess.run(cmd, check=True, capture_output=True)
+            # Update shorts with file paths
+            if file_paths:
+                db.session.bulk_update_mappings(VideoShort, file_paths)
+                db.session.commit()
 
         except Exception as e:
-            self.logger.warning(f"Failed to generate thumbnail: {e}")
+            raise Exception(f"Failed to generate shorts: {e}")
 
     def _cleanup_temporary_files(self, job):
         """Clean up temporary files after processing"""
         try:
-            # Clean up audio file
-            if job.audio_path and os.path.exists(job.audio_path):
-                os.remove(job.audio_path)
-                self.logger.info(f"Cleaned up audio file: {job.audio_path}")
+            # Clean up audio file; one unlink, no exists() check first
+            if job.audio_path:
+                try:
+                    os.unlink(job.audio_path)
+                    self.logger.info(f"Cleaned up audio file: {job.audio_path}")
+                except FileNotFoundError:
+                    pass
 
             # Clean up any temporary files in temp directory for this job
             temp_dir = 'temp'
@@ -462,10 +912,9 @@ class VideoProcessor:
         except Exception as e:
             self.logger.warning(f"Error during cleanup for job {job.id}: {e}")
 
-    def _select_preferred_audio_stream(self, video_path):
-        """Select audio stream with Hindi first, English second priority"""
-        try:
-            # Get detailed stream information
+    def _probe_video(self, video_path):
+        """Return parsed ffprobe stream/format info, or None if probing fails"""
+        if video_path not in self._probe_cache:
             probe_cmd = [
                 'ffprobe', '-v', 'quiet', '-print_format', 'json',
                 '-show_streams', '-show_format', video_path
@@ -473,13 +922,56 @@ class VideoProcessor:
             probe_result = subprocess.run(probe_cmd,
                                           capture_output=True,
                                           text=True)
-
             if probe_result.returncode != 0:
+                return None
+            self._probe_cache[video_path] = json.loads(probe_result.stdout)
+        return self._probe_cache[video_path]
+
+    def _select_preferred_audio_stream(self, video_path):
+        """Select audio stream with Hindi first, English second priority.
+
+        Returns (stream index, duration in seconds); the duration comes from
+        the same probe and is None if it isn't available. The choice is
+        remembered per path, so later steps get the same stream.
+        """
+        if video_path not in self._audio_stream_cache:
+            self._audio_stream_cache[video_path] = self._pick_audio_stream(
+                video_path)
+        return self._audio_stream_cache[video_path]
+
+    def _audio_stream_codec(self, video_path):
+        """Return (index, codec name) of the preferred audio stream.
+
+        Both are None when the video has no audio or can't be probed.
+        """
+        probe_data = self._probe_video(video_path)
+        if probe_data is None:
+            return None, None
+        audio_streams = [
+            s for s in probe_data.get('streams', [])
+            if s.get('codec_type') == 'audio'
+        ]
+        index, _ = self._select_preferred_audio_stream(video_path)
+        if index >= len(audio_streams):
+            return None, None
+        return index, audio_streams[index].get('codec_name')
+
+    def _pick_audio_stream(self, video_path):
+        """Probe video_path and pick its audio stream; see _select_preferred_audio_stream"""
+        try:
+            # Get detailed stream information
+            probe_data = self._probe_video(video_path)
+
+            if probe_data is None:
                 self.logger.warning(
                     "Could not probe video streams, using default audio")
-                return 0
+                return 0, None
+
+            try:
+                duration = float(probe_data['format']['duration'])
+            except (KeyError, TypeError, ValueError):
+                duration = None
 
-            probe_data = json.loads(probe_result.stdout)
             audio_streams = [
                 s for s in probe_data.get('streams', [])
                 if s.get('codec_type') == 'audio'
@@ -487,7 +979,7 @@ class VideoProcessor:
 
             if not audio_streams:
                 self.logger.warning("No audio streams found")
-                return 0
+                return 0, duration
 
             self.logger.info(f"Found {len(audio_streams)} audio streams")
 
@@ -506,21 +998,15 @@ class VideoProcessor:
                 )
 
                 # Check for Hindi indicators
-                hindi_indicators = ['hi', 'hin', 'hindi', 'हिंदी', 'हिन्दी']
-                if any(indicator in language for indicator in hindi_indicators) or \
-                   any(indicator in title for indicator in hindi_indicators):
+                if HINDI_RE.search(language) or HINDI_RE.search(title):
                     hindi_stream = idx
                     self.logger.info(
                         f"Found Hindi audio stream at index {idx}")
                     break  # Hindi has highest priority, use immediately
 
                 # Check for English indicators
-                english_indicators = ['en', 'eng', 'english']
-                if english_stream is None and (
-                        any(indicator in language
-                            for indicator in english_indicators)
-                        or any(indicator in title
-                               for indicator in english_indicators)):
+                if english_stream is None and (ENGLISH_RE.search(language)
+                                               or ENGLISH_RE.search(title)):
                     english_stream = idx
                     self.logger.info(
                         f"Found English audio stream at index {idx}")
@@ -528,8 +1014,7 @@ class VideoProcessor:
                 # Also check stream metadata for more clues
                 if 'metadata' in stream:
                     metadata = stream['metadata']
-                    if any(key for key in metadata.keys()
-                           if 'hindi' in key.lower() or 'hi' in key.lower()):
+                    if any(HINDI_RE.search(key) for key in metadata.keys()):
                         hindi_stream = idx
                         self.logger.info(
                             f"Found Hindi audio stream via metadata at index {idx}"
@@ -539,16 +1024,16 @@ class VideoProcessor:
             # Return in priority order: Hindi -> English -> Default
             if hindi_stream is not None:
                 self.logger.info(f"Using Hindi audio stream: {hindi_stream}")
-                return hindi_stream
+                return hindi_stream, duration
             elif english_stream is not None:
                 self.logger.info(
                     f"Using English audio stream: {english_stream}")
-                return english_stream
+                return english_stream, duration
             else:
                 self.logger.info(
                     f"Using default audio stream: {default_stream}")
-                return default_stream
+                return default_stream, duration
 
         except Exception as e:
             self.logger.error(f"Error selecting audio stream: {e}")
-            return 0  # Fallback to first stream
+            return 0, None  # Fallback to first stream
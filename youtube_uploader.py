@@ -1,227 +1,720 @@
 import os
+import atexit
 import shutil
+import time
 import logging
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType, SimpleNamespace
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from flask import has_app_context
+from sqlalchemy import select, update
 from app import app, db
-from models import VideoShort, YouTubeCredentials, UploadStatus
-from oauth_handler import OAuthHandler
+from models import VideoJob, VideoShort, YouTubeCredentials, UploadStatus, upload_claimable
+from oauth_handler import get_oauth_handler, token_usable
 
 logger = logging.getLogger(__name__)
 
+# Resumable upload chunk size in bytes (must be a multiple of 256 KiB);
+# -1 sends the whole file in a single request
+UPLOAD_CHUNK_SIZE = int(os.environ.get('YT_UPLOAD_CHUNK_SIZE', 30 * 1024 * 1024))
+
+# Parts sent with every videos.insert, and the metadata they share; each
+# upload copies these rather than rebuilding the nested literals
+_PART_STR = 'snippet,status'
+_DEFAULT_TAGS = ('shorts', 'viral')
+_SNIPPET_DEFAULTS = MappingProxyType({
+    'categoryId': '22',  # People & Blogs
+    'defaultLanguage': 'en',
+    'defaultAudioLanguage': 'en'
+})
+_VIDEO_STATUS = MappingProxyType({
+    'privacyStatus': 'public',  # Can be 'private', 'unlisted', or 'public'
+    'madeForKids': False,
+    'selfDeclaredMadeForKids': False
+})
+
+# Uploads are network bound; more than a few at once per user mostly
+# competes for the same uplink and API quota
+MAX_PARALLEL_UPLOADS = 4
+
+# Deletes are I/O bound, but a single disk gains little past a few workers
+MAX_DELETE_WORKERS = 8
+
+# Work directories swept after a job's uploads finish, and how old (in
+# seconds) a file left in them must be to count as stale
+_CLEAN_DIRS = ('uploads', 'temp', 'outputs')
+STALE_FILE_AGE = 3600
+
+# Uploaded files are moved here (one subdirectory per job) and deleted by a
+# background janitor, so cleanup after an upload is only renames. Anything
+# left after a crash is swept on the janitor's next pass or by cleanup.py.
+TRASH_DIR = 'trash'
+
+_janitor = None
+_janitor_lock = threading.Lock()
+_janitor_wakeup = threading.Event()
+_janitor_stop = threading.Event()
+
+# Seconds the interpreter waits at exit for the janitor's last sweep
+JANITOR_EXIT_TIMEOUT = 30
+
+# Socket timeout for YouTube API requests, in seconds
+HTTP_TIMEOUT = 60
+
+# httplib2 keeps connections open per host, so one Http per thread lets
+# every chunk and every later upload on that thread skip the TCP and TLS
+# handshakes. Http objects are not thread-safe and cannot be shared. The
+# YouTube services built on them are kept here too, by user email.
+_connections = threading.local()
+
+
+# Live credentials by user email, reused until their token nears expiry.
+# Each entry holds the Credentials and the token last written to the
+# database. Refreshes (ours, or AuthorizedHttp's mid-upload) replace the
+# token in place, so the two differ until _save_refreshed_token catches up. The lock makes concurrent
+# uploads for one user wait for a single lookup/refresh instead of each
+# hitting the database and token endpoint.
+_credentials_cache = {}
+_credentials_lock = threading.Lock()
+
+
+def forget_credentials(user_email=None):
+    """Drop cached credentials for a user, or for everyone when none is given"""
+    with _credentials_lock:
+        if user_email is None:
+            _credentials_cache.clear()
+        else:
+            _credentials_cache.pop(user_email, None)
+
+
+def _is_auth_error(exc):
+    """Whether an error (or one it was raised from) means Google rejected the tokens"""
+    while exc is not None:
+        if isinstance(exc, RefreshError):
+            return True
+        if isinstance(exc, HttpError) and exc.resp.status == 401:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _save_refreshed_token(user_email):
+    """Write a token refreshed on cached credentials back to the database.
+
+    The caller commits it along with the upload outcome.
+    """
+    with _credentials_lock:
+        entry = _credentials_cache.get(user_email)
+        if entry is None or entry.creds.token == entry.saved_token:
+            return
+        creds = entry.creds
+        entry.saved_token = creds.token
+    db.session.execute(
+        update(YouTubeCredentials)
+        .where(YouTubeCredentials.user_email == user_email)
+        .values(access_token=creds.token, token_expires=creds.expiry)
+    )
+    logger.info("Saved refreshed token for %s", user_email)
+
+
+def _utc_naive(value):
+    """Return a datetime as naive UTC, the form google-auth compares expiry in"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _unlink_names(dirname, dir_fd, names):
+    """Unlink names in one directory, returning the paths removed"""
+    removed = []
+    for name in names:
+        try:
+            if dir_fd is None:
+                os.unlink(os.path.join(dirname, name))
+            else:
+                os.unlink(name, dir_fd=dir_fd)
+            removed.append(os.path.join(dirname, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error("Error deleting %s: %s", os.path.join(dirname, name), e)
+    return removed
+
+
+def _batch_unlink(paths, max_workers=MAX_DELETE_WORKERS):
+    """Delete files, returning the paths actually removed.
+
+    Paths are grouped by directory. Each directory is opened once and its
+    files are unlinked relative to that descriptor, so the kernel does not
+    walk the full path for every file. Missing files are skipped by catching
+    FileNotFoundError instead of stat'ing first. The names are split into
+    about (number of files) / max_workers sized batches unlinked on a
+    thread pool, which bounds latency on slow or network storage.
+    """
+    names_by_dir = defaultdict(list)
+    for path in paths:
+        if path:
+            dirname, name = os.path.split(path)
+            names_by_dir[dirname or '.'].append(name)
+    total = sum(len(names) for names in names_by_dir.values())
+    if not total:
+        return []
+
+    use_dir_fd = os.unlink in os.supports_dir_fd
+    workers = min(max_workers, total)
+    batch_size = -(-total // workers)
+    dir_fds = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for dirname, names in names_by_dir.items():
+                dir_fd = None
+                if use_dir_fd:
+                    try:
+                        dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+                    except FileNotFoundError:
+                        continue
+                    dir_fds.append(dir_fd)
+                for i in range(0, len(names), batch_size):
+                    futures.append(executor.submit(
+                        _unlink_names, dirname, dir_fd, names[i:i + batch_size]))
+            return [path for future in futures for path in future.result()]
+    finally:
+        # Workers are done once the executor exits
+        for dir_fd in dir_fds:
+            os.close(dir_fd)
+
+
+def _stage_for_delete(paths, job_id):
+    """Move files into the job's trash directory, returning the paths handled.
+
+    A file that can't be renamed there (e.g. it lives on another filesystem)
+    is unlinked directly instead.
+    """
+    staging = os.path.join(TRASH_DIR, str(job_id))
+    os.makedirs(staging, exist_ok=True)
+    staged = []
+    unstaged = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.replace(path, os.path.join(staging, os.path.basename(path)))
+            staged.append(path)
+        except OSError:
+            # Includes a missing source, which the unlink then ignores
+            unstaged.append(path)
+    return staged + _batch_unlink(unstaged)
+
+
+def _wake_janitor():
+    """Start the trash janitor thread if needed and have it sweep"""
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None or not _janitor.is_alive():
+            _janitor = threading.Thread(target=_janitor_loop,
+                                        name='trash-janitor', daemon=True)
+            _janitor.start()
+    _janitor_wakeup.set()
+
+
+def _janitor_loop():
+    while True:
+        _janitor_wakeup.wait()
+        _janitor_wakeup.clear()
+        try:
+            _empty_trash()
+        except Exception as e:
+            logger.error("Error emptying %s: %s", TRASH_DIR, e)
+        if _janitor_stop.is_set():
+            return
+
+
+def _stop_janitor():
+    """Let the janitor finish its sweep before the interpreter exits"""
+    with _janitor_lock:
+        janitor = _janitor
+    if janitor is None or not janitor.is_alive():
+        return
+    _janitor_stop.set()
+    _janitor_wakeup.set()
+    janitor.join(JANITOR_EXIT_TIMEOUT)
+
+
+atexit.register(_stop_janitor)
+
+
+def _empty_trash():
+    """Delete every file staged under TRASH_DIR"""
+    try:
+        with os.scandir(TRASH_DIR) as it:
+            job_dirs = [entry.path for entry in it
+                        if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return
+    for job_dir in job_dirs:
+        _empty_trash_dir(job_dir)
+
+
+def _empty_trash_dir(job_dir):
+    """Delete the files staged in one job's trash directory, then the directory"""
+    try:
+        with os.scandir(job_dir) as it:
+            paths = [entry.path for entry in it]
+    except FileNotFoundError:
+        # Emptied by the janitor or another worker
+        return
+    removed = _batch_unlink(paths)
+    try:
+        os.rmdir(job_dir)
+    except OSError:
+        # More files were staged meanwhile; the next pass gets them
+        pass
+    logger.info("Emptied %s: %d files deleted", job_dir, len(removed))
+
+
+def _upload_fields(short):
+    """Plain copy of what _upload_video reads from a short.
+
+    Usable after the session commits (which expires the ORM row) and from
+    other threads.
+    """
+    return SimpleNamespace(id=short.id,
+                           output_path=short.output_path,
+                           title=short.title,
+                           description=short.description,
+                           tags=short.tags)
+
+
+def _thread_http():
+    """Return this thread's keep-alive httplib2 connection pool"""
+    http = getattr(_connections, 'http', None)
+    if http is None:
+        http = _connections.http = httplib2.Http(timeout=HTTP_TIMEOUT)
+    return http
+
 class YouTubeUploader:
-    def __init__(self):
-        self.oauth_handler = OAuthHandler()
+    def __init__(self, delete_many=None, drain_trash=False):
+        self.oauth_handler = get_oauth_handler()
+        self.client_id = self.oauth_handler.client_id
+        self.client_secret = self.oauth_handler.client_secret
+        # Deletes files after upload: called with a list of paths, returns
+        # the ones removed. Storage backends with a native bulk delete (e.g.
+        # object stores) can pass their own; by default local files are
+        # staged in TRASH_DIR for the janitor.
+        self.delete_many = delete_many
+        # Processes that exit right after the upload (RQ work horses end
+        # with os._exit, killing the janitor thread) empty the staged files
+        # themselves before returning
+        self.drain_trash = drain_trash
         
-    def upload_short(self, short_id, user_email):
-        """Upload a video short to YouTube"""
-        with app.app_context():
-            short = VideoShort.query.get(short_id)
-            if not short:
-                logger.error(f"Short {short_id} not found")
+    def upload_short(self, short_or_id, user_email, youtube=None):
+        """Upload a video short to YouTube.
+
+        Takes a VideoShort already loaded in the current session or its id,
+        and optionally a YouTube service to reuse instead of building one.
+        """
+        # A loaded short belongs to the caller's session, which a new app
+        # context would replace
+        with nullcontext() if has_app_context() else app.app_context():
+            loaded = isinstance(short_or_id, VideoShort)
+            short_id = short_or_id.id if loaded else short_or_id
+            if not self._claim_uploads([short_id]):
+                logger.info("Short %s not found, already uploaded or taken by another worker", short_id)
                 return
+            short = short_or_id if loaded else db.session.get(VideoShort, short_id)
+            upload = _upload_fields(short)
             
             try:
-                logger.info(f"Starting YouTube upload for short {short_id}")
-                
-                # Update status
-                short.upload_status = UploadStatus.UPLOADING
-                db.session.commit()
+                logger.info("Starting YouTube upload for short %s", short_id)
                 
-                # Get valid credentials
-                creds = self._get_valid_credentials(user_email)
-                if not creds:
-                    raise Exception("No valid YouTube credentials found")
-                
-                # Build YouTube service
-                youtube = build('youtube', 'v3', credentials=creds)
+                if youtube is None:
+                    # Get valid credentials and this thread's YouTube service
+                    youtube = self._get_service(user_email)
                 
                 # Upload video
-                video_id = self._upload_video(youtube, short)
+                video_id = self._upload_video(youtube, upload)
                 
-                # Update short with YouTube video ID
+                # Update short with YouTube video ID; the status and the
+                # job's pending count go out in one commit
                 short.youtube_video_id = video_id
-                short.upload_status = UploadStatus.COMPLETED
+                self._mark_status(short, UploadStatus.COMPLETED)
+                remaining_shorts = self._complete_pending_short(short.job_id)
+                _save_refreshed_token(user_email)
                 db.session.commit()
                 
                 # Cleanup files after successful upload
-                self._cleanup_short_files(short)
+                self._cleanup_short_files(short, remaining_shorts)
                 
-                logger.info(f"Successfully uploaded short {short_id} to YouTube: {video_id}")
+                logger.info("Successfully uploaded short %s to YouTube: %s", short_id, video_id)
                 
             except Exception as e:
-                logger.error(f"Failed to upload short {short_id}: {e}")
-                short.upload_status = UploadStatus.FAILED
-                short.upload_error = str(e)
-                db.session.commit()
+                logger.error("Failed to upload short %s: %s", short_id, e)
+                db.session.rollback()
+                if _is_auth_error(e):
+                    # Revoked or expired grant; the next upload reloads
+                    # whatever the database holds now
+                    forget_credentials(user_email)
+                else:
+                    _save_refreshed_token(user_email)
+                self._mark_status(short, UploadStatus.FAILED, str(e), commit=True)
+    
+    def _claim_uploads(self, short_ids):
+        """Mark claimable shorts as uploading and commit, returning their ids.
+
+        The conditional UPDATE is the claim: two workers given the same short
+        can't both match it, and nothing stays locked while the upload runs.
+        A claim older than UPLOAD_STALE_AFTER lost its worker and can be
+        taken over.
+        """
+        stmt = (update(VideoShort)
+                .where(VideoShort.id.in_(short_ids), upload_claimable())
+                .values(upload_status=UploadStatus.UPLOADING,
+                        updated_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session='fetch'))
+        if db.engine.dialect.update_returning:
+            claimed = list(db.session.execute(
+                stmt.returning(VideoShort.id)).scalars())
+        else:
+            claimed = [short_id for short_id in short_ids
+                       if db.session.execute(
+                           stmt.where(VideoShort.id == short_id)).rowcount]
+        db.session.commit()
+        return claimed
+    
+    def _mark_status(self, short, status, error=None, commit=False):
+        """Set a short's upload status (and error), committing only if asked"""
+        short.upload_status = status
+        if error is not None:
+            short.upload_error = error
+        if commit:
+            db.session.commit()
     
+    def upload_shorts_batch(self, short_ids, user_email):
+        """Upload several shorts to YouTube concurrently"""
+        with app.app_context():
+            # Claim the shorts nobody else is uploading; overlapping
+            # batches end up with disjoint sets
+            claimed = self._claim_uploads(short_ids)
+            if not claimed:
+                logger.info("No shorts left to upload in %s", short_ids)
+                return
+            shorts = db.session.execute(
+                select(VideoShort).where(VideoShort.id.in_(claimed))
+            ).scalars().all()
+
+            # Workers get plain copies of the upload fields; the ORM objects
+            # belong to this thread's session
+            uploads = [_upload_fields(short) for short in shorts]
+            # End the read so no transaction stays open during the uploads
+            db.session.commit()
+
+            results = {}
+            workers = min(len(uploads), MAX_PARALLEL_UPLOADS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self._upload_in_worker, upload, user_email):
+                    upload.id
+                    for upload in uploads
+                }
+                for future in as_completed(futures):
+                    short_id = futures[future]
+                    try:
+                        results[short_id] = (future.result(), None)
+                    except Exception as e:
+                        logger.error("Failed to upload short %s: %s", short_id, e)
+                        results[short_id] = (None, str(e))
+                        if _is_auth_error(e):
+                            forget_credentials(user_email)
+
+            # Record every outcome, and the pending counts they leave, in
+            # one transaction
+            remaining = {}
+            for short in shorts:
+                video_id, error = results[short.id]
+                if error is None:
+                    short.youtube_video_id = video_id
+                    self._mark_status(short, UploadStatus.COMPLETED)
+                    remaining[short.id] = self._complete_pending_short(short.job_id)
+                else:
+                    self._mark_status(short, UploadStatus.FAILED, error)
+            _save_refreshed_token(user_email)
+            db.session.commit()
+
+            for short in shorts:
+                if short.id in remaining:
+                    self._cleanup_short_files(short, remaining[short.id])
+                    logger.info("Successfully uploaded short %s to YouTube: %s", short.id, short.youtube_video_id)
+
+    def _upload_in_worker(self, short, user_email):
+        """Upload one short on a batch worker thread"""
+        # Credentials are read (and maybe refreshed) in this thread's own
+        # app context and session; a refreshed token is written by the
+        # batch's outcome commit
+        with app.app_context():
+            youtube = self._get_service(user_email)
+        return self._upload_video(youtube, short)
+
+    def _get_service(self, user_email):
+        """Return this thread's YouTube service for a user.
+
+        Services are not thread-safe, so each thread keeps its own per user
+        and rebuilds it only when _get_valid_credentials hands back new
+        credentials.
+        """
+        creds = self._get_valid_credentials(user_email)
+        if not creds:
+            raise Exception("No valid YouTube credentials found")
+        
+        services = getattr(_connections, 'services', None)
+        if services is None:
+            services = _connections.services = {}
+        cached = services.get(user_email)
+        if cached and cached[0] is creds:
+            return cached[1]
+        
+        youtube = self._build_service(creds)
+        services[user_email] = (creds, youtube)
+        return youtube
+
+    def _build_service(self, creds):
+        """Build a YouTube service over this thread's reused connections"""
+        # The discovery document bundled with the client is used, so
+        # building never fetches or caches it over the network
+        return build('youtube', 'v3',
+                     http=AuthorizedHttp(creds, http=_thread_http()),
+                     cache_discovery=False, static_discovery=True)
+
     def _get_valid_credentials(self, user_email):
         """Get valid YouTube credentials, refreshing if necessary"""
         try:
-            db_creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
-            if not db_creds:
-                return None
-            
-            # Create OAuth2 credentials object
-            creds = Credentials(
-                token=db_creds.access_token,
-                refresh_token=db_creds.refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=self.oauth_handler.client_id,
-                client_secret=self.oauth_handler.client_secret
-            )
-            
-            # Refresh if expired
-            if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+            cached = _credentials_cache.get(user_email)
+            if cached and token_usable(cached.creds.expiry):
+                return cached.creds
+
+            with _credentials_lock:
+                # Another upload may have refreshed them while this one waited
+                cached = _credentials_cache.get(user_email)
+                if cached and token_usable(cached.creds.expiry):
+                    return cached.creds
+
+                db_creds = YouTubeCredentials.query.filter_by(user_email=user_email).first()
+                if not db_creds:
+                    _credentials_cache.pop(user_email, None)
+                    return None
                 
-                # Update database with new token
-                db_creds.access_token = creds.token
-                if creds.expiry:
-                    db_creds.token_expires = creds.expiry
-                db.session.commit()
+                # Create OAuth2 credentials object
+                creds = Credentials(
+                    token=db_creds.access_token,
+                    refresh_token=db_creds.refresh_token,
+                    token_uri="https://oauth2.googleapis.com/token",
+                    client_id=self.client_id,
+                    client_secret=self.client_secret,
+                    expiry=_utc_naive(db_creds.token_expires)
+                )
                 
-                logger.info(f"Refreshed credentials for {user_email}")
-            
-            return creds
+                # Refresh only when the stored token is (nearly) expired
+                if not token_usable(creds.expiry) and creds.refresh_token:
+                    creds.refresh(Request())
+                    logger.info("Refreshed credentials for %s", user_email)
+                
+                # saved_token is what the database holds, so a refresh here
+                # is written by _save_refreshed_token in the caller's outcome
+                # commit, whether the upload succeeds or fails
+                _credentials_cache[user_email] = SimpleNamespace(
+                    creds=creds, saved_token=db_creds.access_token)
+                return creds
             
         except Exception as e:
-            logger.error(f"Failed to get valid credentials: {e}")
+            logger.error("Failed to get valid credentials: %s", e)
+            if _is_auth_error(e):
+                forget_credentials(user_email)
             return None
     
     def _upload_video(self, youtube, short):
         """Upload video to YouTube"""
         try:
-            if not short.output_path or not os.path.exists(short.output_path):
+            if not short.output_path:
                 raise Exception("Video file not found")
             
-            # Prepare video metadata
+            # Prepare video metadata; tags are copied so the request never
+            # shares a list with the ORM row or other uploads
             body = {
                 'snippet': {
+                    **_SNIPPET_DEFAULTS,
                     'title': short.title or f"YouTube Short #{short.id}",
                     'description': short.description or "Generated YouTube Short",
-                    'tags': short.tags or ['shorts', 'viral'],
-                    'categoryId': '22',  # People & Blogs
-                    'defaultLanguage': 'en',
-                    'defaultAudioLanguage': 'en'
+                    'tags': list(short.tags) if short.tags else list(_DEFAULT_TAGS)
                 },
-                'status': {
-                    'privacyStatus': 'public',  # Can be 'private', 'unlisted', or 'public'
-                    'madeForKids': False,
-                    'selfDeclaredMadeForKids': False
-                }
+                'status': dict(_VIDEO_STATUS)
             }
             
-            # Create media upload object
-            media = MediaFileUpload(
-                short.output_path,
-                chunksize=-1,
-                resumable=True,
-                mimetype='video/mp4'
-            )
-            
-            # Insert video
-            insert_request = youtube.videos().insert(
-                part=','.join(body.keys()),
-                body=body,
-                media_body=media
-            )
-            
-            # Execute upload
-            response = None
-            while response is None:
-                status, response = insert_request.next_chunk()
-                if status:
-                    logger.info(f"Upload progress {int(status.progress() * 100)}%")
+            # Stream straight from an unbuffered file: reads go directly
+            # into the request body without a second copy through a
+            # BufferedReader, and the file is closed as soon as the upload
+            # ends. Resumable uploads send the stream itself rather than
+            # building a multipart body of the whole file in memory.
+            with open(short.output_path, 'rb', buffering=0) as stream:
+                # Create media upload object
+                media = MediaIoBaseUpload(
+                    stream,
+                    mimetype='video/mp4',
+                    chunksize=UPLOAD_CHUNK_SIZE,
+                    resumable=True
+                )
+                
+                # Insert video
+                insert_request = youtube.videos().insert(
+                    part=_PART_STR,
+                    body=body,
+                    media_body=media
+                )
+                
+                # Execute upload
+                if UPLOAD_CHUNK_SIZE == -1:
+                    # Single request; there is no progress to report
+                    response = insert_request.execute()
+                else:
+                    response = None
+                    # Progress is logged per 10% step, not per chunk, and
+                    # not formatted at all when INFO is disabled
+                    log_progress = logger.isEnabledFor(logging.INFO)
+                    last_step = -1
+                    while response is None:
+                        status, response = insert_request.next_chunk()
+                        if status and log_progress:
+                            pct = int(status.progress() * 100)
+                            if pct // 10 != last_step:
+                                last_step = pct // 10
+                                logger.info("Upload progress %d%%", pct)
             
             if 'id' not in response:
                 raise Exception(f"Upload failed: {response}")
             
             video_id = response['id']
-            logger.info(f"Video uploaded successfully: https://www.youtube.com/watch?v={video_id}")
+            logger.info("Video uploaded successfully: https://www.youtube.com/watch?v=%s", video_id)
             
             return video_id
             
         except Exception as e:
             raise Exception(f"Video upload failed: {e}")
     
-    def _cleanup_short_files(self, short):
-        """Clean up files after successful upload"""
+    def _delete_files(self, paths, job_id):
+        """Hand files to the configured deleter, or stage them in TRASH_DIR for deletion"""
+        if self.delete_many is not None:
+            return self.delete_many(paths)
+        removed = _stage_for_delete(paths, job_id)
+        if self.drain_trash:
+            _empty_trash_dir(os.path.join(TRASH_DIR, str(job_id)))
+        else:
+            _wake_janitor()
+        return removed
+    
+    def _cleanup_short_files(self, short, remaining_shorts):
+        """Clean up files after successful upload.
+
+        remaining_shorts is what _complete_pending_short returned for it.
+        """
         try:
-            # Delete the short video file
-            if short.output_path and os.path.exists(short.output_path):
-                os.remove(short.output_path)
-                logger.info(f"Deleted short video file: {short.output_path}")
-            
-            # Delete thumbnail if exists
-            if short.thumbnail_path and os.path.exists(short.thumbnail_path):
-                os.remove(short.thumbnail_path)
-                logger.info(f"Deleted thumbnail file: {short.thumbnail_path}")
+            short_files = [short.output_path, short.thumbnail_path]
             
             # Check if this was the last short for the job
             job = short.job
-            remaining_shorts = VideoShort.query.filter_by(job_id=job.id).filter(
-                VideoShort.upload_status != UploadStatus.COMPLETED
-            ).count()
             
             if remaining_shorts == 0:
-                # All shorts uploaded, clean up job files
-                self._cleanup_job_files(job)
+                # All shorts uploaded: delete the short's and the job's
+                # files in one sweep
+                self._cleanup_job_files(job, short_files)
+            else:
+                for path in self._delete_files(short_files, job.id):
+                    logger.info("Deleted short file: %s", path)
                 
         except Exception as e:
-            logger.error(f"Error during file cleanup: {e}")
+            logger.error("Error during file cleanup: %s", e)
+    
+    def _complete_pending_short(self, job_id):
+        """Take one short off the job's pending count and return what is left.
+
+        The decrement happens in the database, so when several uploads of a
+        job finish at once exactly one of them sees zero. Returns None when
+        the count was already zero. The caller commits.
+        """
+        stmt = (update(VideoJob)
+                .where(VideoJob.id == job_id, VideoJob.pending_shorts > 0)
+                .values(pending_shorts=VideoJob.pending_shorts - 1))
+        if db.engine.dialect.update_returning:
+            remaining = db.session.execute(
+                stmt.returning(VideoJob.pending_shorts)).scalar()
+        else:
+            if db.session.execute(stmt).rowcount == 0:
+                remaining = None
+            else:
+                remaining = db.session.execute(
+                    select(VideoJob.pending_shorts).where(
+                        VideoJob.id == job_id)).scalar()
+        return remaining
     
-    def _cleanup_job_files(self, job):
+    def _cleanup_job_files(self, job, extra_files=()):
         """Clean up all files related to a job after all shorts are uploaded"""
         try:
-            # Delete original video file
-            if job.video_path and os.path.exists(job.video_path):
-                os.remove(job.video_path)
-                logger.info(f"Deleted original video file: {job.video_path}")
-            
-            # Delete audio file
-            if job.audio_path and os.path.exists(job.audio_path):
-                os.remove(job.audio_path)
-                logger.info(f"Deleted audio file: {job.audio_path}")
-            
-            # Delete transcript file
-            if job.transcript_path and os.path.exists(job.transcript_path):
-                os.remove(job.transcript_path)
-                logger.info(f"Deleted transcript file: {job.transcript_path}")
+            # Original video, audio and transcript, plus any short files
+            # the caller is cleaning up at the same time
+            paths = [*extra_files, job.video_path, job.audio_path,
+                     job.transcript_path]
+            for path in self._delete_files(paths, job.id):
+                logger.info("Deleted file: %s", path)
             
             # Clean up empty directories
             self._cleanup_empty_directories()
             
-            logger.info(f"Completed cleanup for job {job.id}")
+            logger.info("Completed cleanup for job %s", job.id)
             
         except Exception as e:
-            logger.error(f"Error during job cleanup: {e}")
+            logger.error("Error during job cleanup: %s", e)
     
     def _cleanup_empty_directories(self):
-        """Remove empty uploads and temp directories"""
+        """Remove stale files from the work directories"""
         try:
-            directories_to_clean = ['uploads', 'temp', 'outputs']
+            cutoff = time.time() - STALE_FILE_AGE
             
-            for dir_name in directories_to_clean:
-                if os.path.exists(dir_name):
-                    # Check if directory is empty
-                    if not os.listdir(dir_name):
-                        # Directory is empty, but don't delete it as it might be needed later
-                        logger.info(f"Directory {dir_name} is empty and ready for next use")
-                    else:
-                        # Remove any remaining temporary files older than 1 hour
-                        import time
-                        current_time = time.time()
-                        for filename in os.listdir(dir_name):
-                            file_path = os.path.join(dir_name, filename)
-                            if os.path.isfile(file_path):
-                                file_age = current_time - os.path.getmtime(file_path)
-                                # Remove files older than 1 hour (3600 seconds)
-                                if file_age > 3600:
-                                    os.remove(file_path)
-                                    logger.info(f"Removed old temporary file: {file_path}")
+            for dir_name in _CLEAN_DIRS:
+                # One scandir per directory; DirEntry caches the file type
+                # and stat, so each entry costs one lstat at most
+                try:
+                    with os.scandir(dir_name) as it:
+                        entries = list(it)
+                except FileNotFoundError:
+                    continue
+                
+                if not entries:
+                    # Directory is empty, but don't delete it as it might be needed later
+                    logger.info("Directory %s is empty and ready for next use", dir_name)
+                    continue
+                
+                stale = []
+                for entry in entries:
+                    try:
+                        if (entry.is_file(follow_symlinks=False) and
+                                entry.stat(follow_symlinks=False).st_mtime < cutoff):
+                            stale.append(entry.path)
+                    except FileNotFoundError:
+                        pass
+                
+                # Unlinked relative to one descriptor for the directory
+                if stale:
+                    removed = _batch_unlink(stale)
+                    logger.info("Removed %d old temporary files from %s", len(removed), dir_name)
                         
         except Exception as e:
-            logger.error(f"Error during directory cleanup: {e}")
+            logger.error("Error during directory cleanup: %s", e)